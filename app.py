@@ -1,8 +1,9 @@
 import logging
+from datetime import timedelta
 
 import click
 
-from behance_parser import exporter, html_parser, parser, storage
+from behance_parser import dedup, exporter, html_parser, metrics, parser, storage
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,8 +12,45 @@ logger = logging.getLogger(__name__)
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--db",
+    envvar="BEHANCE_DB_URL",
+    default=None,
+    help="SQLAlchemy URL or SQLite file path of the database",
+)
+@click.option(
+    "--metrics-file",
+    envvar="BEHANCE_METRICS_FILE",
+    default=None,
+    help="Write Prometheus-format metrics to this file when the command ends",
+)
+@click.option(
+    "--metrics-port",
+    envvar="BEHANCE_METRICS_PORT",
+    type=int,
+    default=None,
+    help="Serve Prometheus-format metrics over HTTP on this port at /metrics",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print a per-stage timing breakdown when the command ends",
+)
+@click.pass_context
+def cli(ctx, db, metrics_file, metrics_port, profile):
+    if db:
+        storage.configure(db)
+    ctx.obj = dict(metrics_file=metrics_file, profile=profile)
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+
+    @ctx.call_on_close
+    def _report_metrics():
+        if metrics_file:
+            metrics.write_file(metrics_file)
+        if profile:
+            click.echo(metrics.format_profile())
 
 
 @cli.command(name="add-agencies")
@@ -23,22 +61,323 @@ def add_agencies(agencies):
 
 
 @cli.command(name="collect-tasks")
-def collect_tasks():
+@click.option(
+    "--concurrency",
+    default=8,
+    show_default=True,
+    help="Number of agencies paginated at the same time",
+)
+@click.option(
+    "--rate",
+    default=5.0,
+    show_default=True,
+    help="Maximum listing requests per second overall",
+)
+@click.option(
+    "--per-host-rate",
+    default=2.0,
+    show_default=True,
+    help="Maximum listing requests per second to a single host",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Page through every agency listing instead of stopping at known projects",
+)
+def collect_tasks(concurrency, rate, per_host_rate, full):
     logger.info("Invoked command collect-tasks")
-    parser.collect_tasks_for_parsing()
+    parser.collect_tasks_for_parsing(
+        concurrency=concurrency,
+        rate=rate,
+        per_host_rate=per_host_rate,
+        full=full,
+    )
 
 
 @cli.command(name="process-tasks")
-def process_tasks():
+@click.option(
+    "--browsers",
+    default=1,
+    show_default=True,
+    help="Number of headless browsers rendering project pages in parallel",
+)
+@click.option(
+    "--recycle-after",
+    default=50,
+    show_default=True,
+    help="Restart each browser after rendering this many pages",
+)
+@click.option("--headless/--no-headless", default=True, show_default=True)
+@click.option(
+    "--http-first/--browser-only",
+    default=True,
+    show_default=True,
+    help="Try a plain HTTP fetch before rendering the page in a browser",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    help="Number of worker processes sharing the task queue",
+)
+@click.option(
+    "--lease-seconds",
+    default=900,
+    show_default=True,
+    help="How long a claimed task stays reserved for its worker",
+)
+@click.option(
+    "--html-engine",
+    type=click.Choice(["auto", "selectolax", "bs4"]),
+    default="auto",
+    show_default=True,
+    help="HTML parsing engine, auto prefers selectolax when installed",
+)
+@click.option(
+    "--fetchers",
+    default=4,
+    show_default=True,
+    help="Number of threads fetching project pages over HTTP",
+)
+@click.option(
+    "--parsers",
+    type=int,
+    default=None,
+    help="Number of processes parsing project pages  [default: CPU count]",
+)
+@click.option(
+    "--writers",
+    default=2,
+    show_default=True,
+    help="Number of threads downloading images and storing parsed projects",
+)
+@click.option(
+    "--fetch-queue",
+    default=16,
+    show_default=True,
+    help="Claimed tasks waiting to be fetched",
+)
+@click.option(
+    "--parse-queue",
+    default=16,
+    show_default=True,
+    help="Fetched pages waiting to be parsed",
+)
+@click.option(
+    "--write-queue",
+    default=16,
+    show_default=True,
+    help="Parsed projects waiting to be stored",
+)
+@click.option(
+    "--snapshots/--no-snapshots",
+    default=False,
+    show_default=True,
+    help="Keep compressed page HTML so projects can be re-parsed offline",
+)
+@click.option(
+    "--snapshot-ttl",
+    default=168,
+    show_default=True,
+    help="Hours a page snapshot stays usable",
+)
+@click.option(
+    "--max-image-width",
+    type=int,
+    default=None,
+    help="Pick the largest srcset image not wider than this and downscale to it",
+)
+@click.option(
+    "--transcode",
+    type=click.Choice(["webp", "avif"]),
+    default=None,
+    help="Re-encode downloaded images, needs Pillow",
+)
+@click.option(
+    "--transcode-quality",
+    default=80,
+    show_default=True,
+    help="Encoder quality used with --transcode",
+)
+@click.option(
+    "--dedup/--no-dedup",
+    "deduplicate",
+    default=False,
+    show_default=True,
+    help="Reuse stored images with the same file name or a near-identical picture",
+)
+@click.option(
+    "--dedup-distance",
+    default=dedup.DEFAULT_MAX_DISTANCE,
+    show_default=True,
+    help="Maximum perceptual hash distance between near-duplicate images",
+)
+@click.option(
+    "--download-concurrency",
+    default=16,
+    show_default=True,
+    help="Maximum image downloads in flight across all projects",
+)
+@click.option(
+    "--adaptive-downloads/--fixed-downloads",
+    default=True,
+    show_default=True,
+    help="Tune in-flight downloads to observed throughput, latency and throttling",
+)
+@click.option(
+    "--download-budget",
+    default=256,
+    show_default=True,
+    help="MB of queued image downloads before storing new projects waits",
+)
+def process_tasks(
+    browsers,
+    recycle_after,
+    headless,
+    http_first,
+    workers,
+    lease_seconds,
+    html_engine,
+    fetchers,
+    parsers,
+    writers,
+    fetch_queue,
+    parse_queue,
+    write_queue,
+    snapshots,
+    snapshot_ttl,
+    max_image_width,
+    transcode,
+    transcode_quality,
+    deduplicate,
+    dedup_distance,
+    download_concurrency,
+    adaptive_downloads,
+    download_budget,
+):
     logger.info("Invoked command process-tasks")
-    html_parser.process_tasks()
+    ctx = click.get_current_context()
+    options = dict(
+        browsers=browsers,
+        recycle_after=recycle_after,
+        headless=headless,
+        http_first=http_first,
+        lease_seconds=lease_seconds,
+        html_engine=html_engine,
+        fetchers=fetchers,
+        parsers=parsers,
+        writers=writers,
+        fetch_queue_size=fetch_queue,
+        parse_queue_size=parse_queue,
+        write_queue_size=write_queue,
+        snapshot_ttl=timedelta(hours=snapshot_ttl) if snapshots else None,
+        max_image_width=max_image_width,
+        transcode=transcode,
+        transcode_quality=transcode_quality,
+        dedup_distance=dedup_distance if deduplicate else None,
+        download_concurrency=download_concurrency,
+        adaptive_downloads=adaptive_downloads,
+        download_budget=download_budget * 1024 * 1024,
+    )
+    if workers > 1:
+        html_parser.run_workers(workers, **ctx.obj, **options)
+    else:
+        html_parser.process_tasks(**options)
+
+
+@cli.command(name="reparse-tasks")
+@click.option(
+    "--html-engine",
+    type=click.Choice(["auto", "selectolax", "bs4"]),
+    default="auto",
+    show_default=True,
+    help="HTML parsing engine, auto prefers selectolax when installed",
+)
+@click.option(
+    "--parsers",
+    type=int,
+    default=None,
+    help="Number of processes parsing project pages  [default: CPU count]",
+)
+@click.option(
+    "--snapshot-ttl",
+    default=168,
+    show_default=True,
+    help="Hours a page snapshot stays usable",
+)
+@click.option(
+    "--all",
+    "all_tasks",
+    is_flag=True,
+    default=False,
+    help="Re-parse every snapshot instead of only failed projects",
+)
+@click.option(
+    "--max-image-width",
+    type=int,
+    default=None,
+    help="Pick the largest srcset image not wider than this",
+)
+def reparse_tasks(html_engine, parsers, snapshot_ttl, all_tasks, max_image_width):
+    logger.info("Invoked command reparse-tasks")
+    html_parser.reparse_tasks(
+        html_engine=html_engine,
+        parsers=parsers,
+        snapshot_ttl=timedelta(hours=snapshot_ttl),
+        failed_only=not all_tasks,
+        max_image_width=max_image_width,
+    )
+
+
+@cli.command(name="dedup-images")
+@click.option(
+    "--distance",
+    default=dedup.DEFAULT_MAX_DISTANCE,
+    show_default=True,
+    help="Maximum perceptual hash distance between near-duplicate images",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of processes hashing images  [default: CPU count]",
+)
+def dedup_images(distance, workers):
+    logger.info("Invoked command dedup-images")
+    dedup.deduplicate_stored_images(max_distance=distance, workers=workers)
+
+
+@cli.command(name="migrate-images")
+def migrate_images():
+    logger.info("Invoked command migrate-images")
+    migrated = storage.migrate_legacy_images()
+    logger.info("Moved %s images to blob store", migrated)
 
 
 @cli.command(name="export-data")
 @click.option("--path", default=None, help="Path to exporting parsing results")
-def export_data(path):
+@click.option(
+    "--workers",
+    default=8,
+    show_default=True,
+    help="Number of threads writing project folders",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Rewrite every project instead of only new or changed ones",
+)
+@click.option(
+    "--prune",
+    is_flag=True,
+    default=False,
+    help="Remove exported projects that are no longer in the database",
+)
+def export_data(path, workers, full, prune):
     logger.info("Invoked command export-data")
-    exporter.export_data_to(path)
+    exporter.export_data_to(path, workers=workers, full=full, prune=prune)
     logger.info("Exporting data finished")
 
 
@@ -0,0 +1,161 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409
+
+MIME_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+@dataclass(frozen=True)
+class Blob:
+    hash: str
+    size: int
+    mime_type: str
+    width: int | None = None
+    height: int | None = None
+
+
+def guess_mime_type(data: bytes) -> str:
+    for signature, mime_type in MIME_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    def __init__(self, root: str | Path, shard_depth: int = 2) -> None:
+        self._root = Path(root)
+        self._shard_depth = shard_depth
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def path_for(self, digest: str) -> Path:
+        shards = [digest[i * 2 : i * 2 + 2] for i in range(self._shard_depth)]
+        return self._root.joinpath(*shards, digest)
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, data: bytes) -> Blob:
+        digest = hashlib.sha256(data).hexdigest()
+        blob = Blob(hash=digest, size=len(data), mime_type=guess_mime_type(data))
+        path = self.path_for(digest)
+        if path.exists():
+            return blob
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        logger.debug("Stored blob %s (%s bytes)", digest, blob.size)
+        return blob
+
+    def open_writer(self) -> "BlobWriter":
+        self._root.mkdir(parents=True, exist_ok=True)
+        return BlobWriter(self)
+
+    def read(self, digest: str) -> bytes:
+        return self.path_for(digest).read_bytes()
+
+    def delete(self, digest: str) -> None:
+        self.path_for(digest).unlink(missing_ok=True)
+
+    def link(self, digest: str, destination: Path) -> None:
+        source = self.path_for(digest)
+        # An existing destination may be a hardlink of a blob, so it is only
+        # ever replaced, never opened for writing.
+        tmp_path = destination.with_name(f".tmp-{uuid.uuid4().hex}")
+        try:
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                if not _reflink(source, tmp_path):
+                    shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+class BlobWriter:
+    def __init__(self, store: BlobStore) -> None:
+        self._store = store
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._head = b""
+        self._committed = False
+        fd, tmp_path = tempfile.mkstemp(dir=store.root, prefix=".tmp-")
+        self._tmp_path = Path(tmp_path)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        if len(self._head) < 16:
+            self._head += chunk[: 16 - len(self._head)]
+        self._hash.update(chunk)
+        self._size += len(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Blob:
+        self._file.close()
+        self._committed = True
+        digest = self._hash.hexdigest()
+        path = self._store.path_for(digest)
+        if path.exists():
+            self._tmp_path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(self._tmp_path, 0o644)
+            os.replace(self._tmp_path, path)
+        return Blob(
+            hash=digest,
+            size=self._size,
+            mime_type=guess_mime_type(self._head),
+        )
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._committed:
+            self.abort()
+
+
+def _reflink(source: Path, destination: Path) -> bool:
+    try:
+        with open(source, "rb") as src, open(destination, "xb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        destination.unlink(missing_ok=True)
+        return False
+    return True
+
+
+default_store = BlobStore(os.environ.get("BEHANCE_BLOB_DIR", "blobs"))
@@ -0,0 +1,82 @@
+import logging
+import queue
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PooledDriver:
+    driver: WebDriver
+    pages: int = 0
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int,
+        driver_factory: Callable[[], WebDriver],
+        max_pages: int = 50,
+    ) -> None:
+        self._size = size
+        self._driver_factory = driver_factory
+        self._max_pages = max_pages
+        self._idle: queue.Queue[_PooledDriver | None] = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _spawn(self) -> _PooledDriver:
+        logger.info("Starting new browser")
+        return _PooledDriver(driver=self._driver_factory())
+
+    @staticmethod
+    def _is_alive(driver: WebDriver) -> bool:
+        try:
+            driver.current_url
+        except WebDriverException:
+            return False
+        return True
+
+    @staticmethod
+    def _quit(entry: _PooledDriver) -> None:
+        try:
+            entry.driver.quit()
+        except WebDriverException:
+            logger.warning("Error while closing browser", exc_info=True)
+
+    @contextmanager
+    def lease(self) -> Iterator[WebDriver]:
+        entry = self._idle.get()
+        try:
+            if entry is None:
+                entry = self._spawn()
+            yield entry.driver
+        except WebDriverException:
+            if entry and not self._is_alive(entry.driver):
+                logger.warning("Browser crashed, discarding it")
+                self._quit(entry)
+                entry = None
+            raise
+        finally:
+            if entry:
+                entry.pages += 1
+                if entry.pages >= self._max_pages:
+                    logger.info("Recycling browser after %s pages", entry.pages)
+                    self._quit(entry)
+                    entry = None
+            self._idle.put(entry)
+
+    def close(self) -> None:
+        for _ in range(self._size):
+            entry = self._idle.get()
+            if entry:
+                self._quit(entry)
@@ -0,0 +1,292 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from behance_parser import storage
+from behance_parser.blob_store import Blob, BlobStore, default_store
+
+try:
+    from PIL import Image as PillowImage
+except ImportError:
+    PillowImage = None
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+MIN_HASH_BITS = 8
+DEFAULT_MAX_DISTANCE = 4
+MAX_COLOR_DIFFERENCE = 16
+ORPHAN_GRACE_SECONDS = 3600
+
+
+# The grayscale difference hash cannot tell colour variants of one design
+# apart, so near duplicates must also have a close mean colour.
+@dataclass(frozen=True)
+class PerceptualHash:
+    bits: int
+    color: tuple[int, int, int]
+
+    def __str__(self) -> str:
+        red, green, blue = self.color
+        return f"{self.bits:016x}{red:02x}{green:02x}{blue:02x}"
+
+    @classmethod
+    def parse(cls, value: str | None) -> "PerceptualHash | None":
+        if not value or len(value) != 22:
+            return None
+        color = bytes.fromhex(value[16:])
+        return cls(int(value[:16], 16), (color[0], color[1], color[2]))
+
+    @property
+    def is_distinctive(self) -> bool:
+        return MIN_HASH_BITS <= self.bits.bit_count() <= HASH_SIZE**2 - MIN_HASH_BITS
+
+    def has_similar_color(self, other: "PerceptualHash") -> bool:
+        return all(
+            abs(a - b) <= MAX_COLOR_DIFFERENCE for a, b in zip(self.color, other.color)
+        )
+
+
+def perceptual_hash(data: bytes) -> PerceptualHash | None:
+    if PillowImage is None:
+        return None
+    try:
+        with PillowImage.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (HASH_SIZE * 8, HASH_SIZE * 8))
+            image = image.convert("RGB")
+            pixels = (
+                image.convert("L")
+                .resize((HASH_SIZE + 1, HASH_SIZE), PillowImage.Resampling.LANCZOS)
+                .tobytes()
+            )
+            color = image.resize((1, 1), PillowImage.Resampling.BOX).getpixel((0, 0))
+    except (OSError, ValueError):
+        return None
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            bits = bits << 1 | (pixels[offset] > pixels[offset + 1])
+    return PerceptualHash(bits, tuple(color))
+
+
+def perceptual_hash_file(path: str) -> PerceptualHash | None:
+    with open(path, "rb") as image_file:
+        return perceptual_hash(image_file.read())
+
+
+def format_hash(phash: PerceptualHash | None) -> str | None:
+    return None if phash is None else str(phash)
+
+
+@dataclass
+class _Node:
+    key: int
+    value: tuple[PerceptualHash, Blob]
+    children: dict[int, "_Node"] = field(default_factory=dict)
+
+
+class BKTree:
+    def __init__(self) -> None:
+        self._root: _Node | None = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: tuple[PerceptualHash, Blob]) -> None:
+        if self._root is None:
+            self._root = _Node(key, value)
+            self._size += 1
+            return
+        node = self._root
+        while True:
+            distance = (key ^ node.key).bit_count()
+            if distance == 0:
+                return
+            if distance not in node.children:
+                node.children[distance] = _Node(key, value)
+                self._size += 1
+                return
+            node = node.children[distance]
+
+    def search(
+        self, key: int, max_distance: int
+    ) -> Iterator[tuple[int, tuple[PerceptualHash, Blob]]]:
+        nodes = [self._root] if self._root else []
+        while nodes:
+            node = nodes.pop()
+            distance = (key ^ node.key).bit_count()
+            if distance <= max_distance:
+                yield distance, node.value
+            nodes.extend(
+                child
+                for child_distance, child in node.children.items()
+                if abs(child_distance - distance) <= max_distance
+            )
+
+
+class ImageIndex:
+    def __init__(
+        self,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        store: BlobStore = default_store,
+    ) -> None:
+        self._max_distance = max_distance
+        self._store = store
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.stats: Counter[str] = Counter()
+
+    @classmethod
+    def load(
+        cls,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        store: BlobStore = default_store,
+    ) -> "ImageIndex":
+        index = cls(max_distance, store)
+        last_id = 0
+        while images := storage.get_done_images(after_id=last_id):
+            for image in images:
+                if phash := PerceptualHash.parse(image.phash):
+                    index.add(phash, _image_blob(image))
+            last_id = images[-1].id
+        storage.db_session.expunge_all()
+        logger.info("Loaded %s perceptual hashes into the dedup index", len(index))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def add(self, phash: PerceptualHash, blob: Blob) -> None:
+        if not phash.is_distinctive:
+            return
+        with self._lock:
+            self._tree.add(phash.bits, (phash, blob))
+
+    def find_similar(self, phash: PerceptualHash, digest: str) -> Blob | None:
+        if not phash.is_distinctive:
+            return None
+        with self._lock:
+            matches = sorted(
+                (distance, blob.hash, blob)
+                for distance, (other, blob) in self._tree.search(
+                    phash.bits, self._max_distance
+                )
+                if blob.hash != digest and phash.has_similar_color(other)
+            )
+        return matches[0][2] if matches else None
+
+    def find_family(self, url: str) -> Blob | None:
+        image = storage.find_done_image(storage.image_uuid(url))
+        if image is None or not self._store.exists(image.hash):
+            return None
+        self.stats["family_hits"] += 1
+        self.stats["download_bytes_saved"] += image.size
+        return _image_blob(image)
+
+    def deduplicate(self, blob: Blob) -> tuple[Blob, str | None]:
+        try:
+            phash = perceptual_hash(self._store.read(blob.hash))
+        except OSError:
+            logger.warning("Can't read blob %s for dedup", blob.hash, exc_info=True)
+            return blob, None
+        if phash is None:
+            return blob, None
+        similar = self.find_similar(phash, blob.hash)
+        if similar is None:
+            self.add(phash, blob)
+            return blob, format_hash(phash)
+        # Another download may already share this blob without being marked
+        # done yet, so the unused copy is left for dedup-images to sweep.
+        self.stats["near_duplicates"] += 1
+        return similar, format_hash(phash)
+
+    def log_stats(self) -> None:
+        logger.info(
+            "Dedup skipped %s downloads (%.1f MB) and linked %s near duplicates "
+            "(%.1f MB freed)",
+            self.stats["family_hits"],
+            self.stats["download_bytes_saved"] / 1024 / 1024,
+            self.stats["near_duplicates"],
+            self.stats["storage_bytes_saved"] / 1024 / 1024,
+        )
+
+
+def _image_blob(image: storage.Image) -> Blob:
+    return Blob(
+        hash=image.hash,
+        size=image.size,
+        mime_type=image.mime_type,
+        width=image.width,
+        height=image.height,
+    )
+
+
+def deduplicate_stored_images(
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    workers: int | None = None,
+    batch_size: int = 500,
+    store: BlobStore = default_store,
+) -> Counter[str]:
+    index = ImageIndex(max_distance, store)
+    last_id = 0
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        while images := storage.get_done_images(after_id=last_id, limit=batch_size):
+            last_id = images[-1].id
+            missing = [
+                i
+                for i in images
+                if PerceptualHash.parse(i.phash) is None and store.exists(i.hash)
+            ]
+            hashes = executor.map(
+                perceptual_hash_file, [str(store.path_for(i.hash)) for i in missing]
+            )
+            computed = {i.id: format_hash(h) for i, h in zip(missing, hashes)}
+            for image in images:
+                phash = PerceptualHash.parse(computed.get(image.id, image.phash))
+                if phash is None:
+                    continue
+                blob = _image_blob(image)
+                similar = index.find_similar(phash, blob.hash)
+                if similar is None:
+                    index.add(phash, blob)
+                    if image.id in computed:
+                        storage.relink_images([image.id], blob, str(phash))
+                    continue
+                storage.relink_images([image.id], similar, str(phash))
+                index.stats["near_duplicates"] += 1
+            storage.db_session.expunge_all()
+    _delete_orphan_blobs(store, index.stats)
+    index.log_stats()
+    return index.stats
+
+
+def _delete_orphan_blobs(
+    store: BlobStore, stats: Counter[str], batch_size: int = 500
+) -> None:
+    # Blobs younger than the grace period may belong to a download that is
+    # not recorded yet.
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    candidates = [
+        path
+        for path in store.root.glob("**/*")
+        if path.is_file()
+        and not path.name.startswith(".tmp-")
+        and path.stat().st_mtime < cutoff
+    ]
+    for i in range(0, len(candidates), batch_size):
+        batch = {path.name: path for path in candidates[i : i + batch_size]}
+        for digest in batch.keys() - storage.get_referenced_blobs(list(batch)):
+            stats["storage_bytes_saved"] += batch[digest].stat().st_size
+            store.delete(digest)
@@ -1,2 +1,14 @@
 class ParsingException(Exception):
     ...
+
+
+class UnknownElementException(ParsingException):
+    ...
+
+
+class RequestException(Exception):
+    ...
+
+
+class CircuitOpenException(RequestException):
+    ...
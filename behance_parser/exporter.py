@@ -1,64 +1,278 @@
+import hashlib
 import json
+import logging
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-from behance_parser import storage
+import sqlalchemy as sa
 
+from behance_parser import blob_store, metrics, storage
 
-def export_data_to(path: str) -> None:
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    "image/jpeg": (".jpg", ".jpeg"),
+    "image/png": (".png",),
+    "image/gif": (".gif",),
+    "image/webp": (".webp",),
+    "image/avif": (".avif",),
+}
+
+
+class _ExportManifest:
+    file_name = ".export-manifest.json"
+
+    def __init__(self, root: Path) -> None:
+        self._path = root / self.file_name
+        self._projects: dict[str, dict] = {}
+        if self._path.exists():
+            with open(self._path) as manifest_file:
+                self._projects = json.load(manifest_file)["projects"]
+
+    def keys(self) -> set[str]:
+        return set(self._projects)
+
+    def is_current(self, key: str, fingerprint: str) -> bool:
+        entry = self._projects.get(key)
+        return bool(entry) and entry["fingerprint"] == fingerprint
+
+    def image_hashes(self, key: str) -> dict[str, str]:
+        return self._projects.get(key, {}).get("images", {})
+
+    def record(self, key: str, fingerprint: str, images: dict[str, str]) -> None:
+        self._projects[key] = dict(
+            fingerprint=fingerprint,
+            images=images,
+            exported_at=datetime.utcnow().isoformat(),
+        )
+
+    def remove(self, key: str) -> None:
+        self._projects.pop(key, None)
+
+    def save(self) -> None:
+        tmp_path = self._path.with_suffix(".tmp")
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(dict(projects=self._projects), manifest_file)
+        os.replace(tmp_path, self._path)
+
+
+class _ExportWriter:
+    def __init__(self, workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(workers * 4)
+        self._lock = threading.Lock()
+        self._futures: list[Future] = []
+        self.projects = 0
+        self.skipped = 0
+        self.images = 0
+        self.bytes = 0
+
+    def submit(
+        self,
+        path: Path,
+        images: list[sa.engine.Row],
+        exported_hashes: dict[str, str],
+        data: dict,
+    ) -> None:
+        self._slots.acquire()
+        future = self._executor.submit(
+            self._write_project, path, images, exported_hashes, data
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _write_project(
+        self,
+        path: Path,
+        images: list[sa.engine.Row],
+        exported_hashes: dict[str, str],
+        data: dict,
+    ) -> None:
+        with metrics.time_stage("export"):
+            path.mkdir(exist_ok=True)
+            images_count, bytes_written = _export_images(
+                images, exported_hashes, path
+            )
+            _export_data(data, path)
+        metrics.exported_bytes.inc(bytes_written)
+        with self._lock:
+            self.projects += 1
+            self.images += images_count
+            self.bytes += bytes_written
+
+    def wait(self) -> None:
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+
+def export_data_to(
+    path: str | None,
+    workers: int = 8,
+    full: bool = False,
+    prune: bool = False,
+) -> None:
     path = _generate_exporting_path(path)
     path.mkdir(parents=True, exist_ok=True)
-    agencies = storage.get_all_agencies()
-    for agency in agencies:
-        _export_agency_data(agency=agency, path=path)
+    started = time.perf_counter()
+    manifest = _ExportManifest(path)
+    exported_keys: set[str] = set()
+    writer = _ExportWriter(workers=workers)
+    try:
+        agencies = storage.get_all_agencies()
+        for agency in agencies:
+            exported_keys |= _export_agency_data(
+                agency=agency,
+                path=path,
+                writer=writer,
+                manifest=manifest,
+                full=full,
+            )
+            manifest.save()
+    finally:
+        writer.close()
+    if prune:
+        _prune_removed_projects(path, manifest, exported_keys)
+        manifest.save()
+    elapsed = time.perf_counter() - started
+    megabytes = writer.bytes / 1024 / 1024
+    logger.info(
+        "Exported %s projects (%s unchanged) and %s images (%.1f MB) "
+        "in %.1fs, %.1f MB/s",
+        writer.projects,
+        writer.skipped,
+        writer.images,
+        megabytes,
+        elapsed,
+        megabytes / elapsed if elapsed else 0,
+    )
 
 
-def _export_agency_data(agency: storage.Agency, path: Path) -> None:
+def _prune_removed_projects(
+    path: Path, manifest: _ExportManifest, exported_keys: set[str]
+) -> None:
+    for key in manifest.keys() - exported_keys:
+        shutil.rmtree(path / key, ignore_errors=True)
+        manifest.remove(key)
+        logger.info("Pruned removed project %s", key)
+
+
+def _export_agency_data(
+    agency: storage.Agency,
+    path: Path,
+    writer: _ExportWriter,
+    manifest: _ExportManifest,
+    full: bool,
+) -> set[str]:
     agency_folder = path / agency.name
     agency_folder.mkdir(exist_ok=True)
     projects = storage.get_tasks_by_agency_id(agency_id=agency.id)
+    texts = storage.get_agency_texts(agency_id=agency.id)
+    videos = storage.get_agency_videos(agency_id=agency.id)
+    images = storage.get_agency_image_files(agency_id=agency.id)
+    changed: dict[str, tuple[str, dict[str, str]]] = {}
     for project in projects:
-        _export_project_data(project, agency_folder)
+        key = f"{agency.name}/{project.behance_id}"
+        fingerprint = _export_project_data(
+            project,
+            agency_folder,
+            writer,
+            texts=texts.get(project.id, []),
+            videos=videos.get(project.id, []),
+            images=images.get(project.id, []),
+            manifest=None if full else manifest,
+            key=key,
+        )
+        if fingerprint:
+            project_images = images.get(project.id, [])
+            changed[key] = (
+                fingerprint,
+                {_image_file_name(i): i.hash for i in project_images},
+            )
+    writer.wait()
+    for key, (fingerprint, image_hashes) in changed.items():
+        manifest.record(key, fingerprint, image_hashes)
+    return {f"{agency.name}/{project.behance_id}" for project in projects}
 
 
-def _export_project_data(project: storage.Task, path: Path) -> None:
+def _export_project_data(
+    project: storage.Task,
+    path: Path,
+    writer: _ExportWriter,
+    texts: list[str],
+    videos: list[str],
+    images: list[sa.engine.Row],
+    manifest: _ExportManifest | None,
+    key: str,
+) -> str | None:
     project_folder = path / str(project.behance_id)
-    project_folder.mkdir(exist_ok=True)
-    images = storage.get_task_images(project.id)
-    _export_images(images, project_folder)
-    texts = storage.get_task_texts(project.id)
-    videos = storage.get_task_videos(project.id)
-    _export_data(
-        project=project,
+    data = dict(
+        name=project.name,
+        id=project.behance_id,
+        url=project.url,
+        agency=project.agency.name,
+        text=texts,
         videos=videos,
-        texts=texts,
-        path=project_folder,
     )
+    fingerprint = _fingerprint(data, images)
+    if manifest and manifest.is_current(key, fingerprint) and project_folder.exists():
+        writer.skipped += 1
+        return None
+    exported_hashes = manifest.image_hashes(key) if manifest else {}
+    writer.submit(project_folder, images, exported_hashes, data)
+    return fingerprint
+
+
+def _fingerprint(data: dict, images: list[sa.engine.Row]) -> str:
+    content = dict(
+        data=data,
+        images=sorted([_image_file_name(image), image.hash] for image in images),
+    )
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
 
 
-def _export_images(images: list[storage.Image], path: Path) -> None:
+def _export_images(
+    images: list[sa.engine.Row], exported_hashes: dict[str, str], path: Path
+) -> tuple[int, int]:
     images_folder = path / "images"
     images_folder.mkdir(exist_ok=True)
-    for image in images:
-        file_path = images_folder / image.uuid
-        if file_path.exists():
+    file_names = {_image_file_name(image): image for image in images}
+    for file_path in images_folder.iterdir():
+        if file_path.name not in file_names:
+            file_path.unlink()
+    exported, bytes_written = 0, 0
+    for file_name, image in file_names.items():
+        file_path = images_folder / file_name
+        if exported_hashes.get(file_name) == image.hash and file_path.exists():
             continue
-        with open(str(file_path), "wb") as _img_file:
-            _img_file.write(image.image)
+        blob_store.default_store.link(image.hash, file_path)
+        exported += 1
+        bytes_written += image.size
+    return exported, bytes_written
+
+
+def _image_file_name(image: sa.engine.Row) -> str:
+    # Transcoded images keep the uuid of the original file, so the extension
+    # follows the stored content instead.
+    extensions = EXTENSIONS.get(image.mime_type)
+    if not extensions:
+        return image.uuid
+    stem, _, suffix = image.uuid.rpartition(".")
+    if stem and f".{suffix.lower()}" in extensions:
+        return image.uuid
+    return f"{stem or image.uuid}{extensions[0]}"
 
 
-def _export_data(project: storage.Task, videos: list[storage.Video], texts: list[storage.Text], path: Path) -> None:
+def _export_data(data: dict, path: Path) -> None:
     data_file_path = path / 'data.json'
-    text_data = [i.text for i in texts]
-    video_data = [i.link for i in videos]
-    data = dict(
-        name=project.name,
-        id=project.behance_id,
-        url=project.url,
-        agency=project.agency.name,
-        text=text_data,
-        videos=video_data,
-    )
     with open(data_file_path, 'w') as data_file:
         data_file.write(json.dumps(data, indent=4))
 
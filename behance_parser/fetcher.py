@@ -1,11 +1,12 @@
+import json
 import logging
 from urllib.parse import urlsplit
 
-import requests
 from pydantic import BaseModel
 
-from behance_parser.exceptions import ParsingException
+from behance_parser import http_cache, http_client, metrics
 from behance_parser.fake_useragent import user_agent
+from behance_parser.rate_limit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +51,6 @@ class ProjectsResponse(Base):
 default_headers = {
     "accept": "*/*",
     "accept-language": "en-US,en;q=0.9",
-    "if-modified-since": "Tue, 19 Jul 2022 16:40:27 +0000",
     "sec-ch-ua": '".Not/A)Brand";v="99", "Google Chrome";v="103", "Chromium";v="103"',
     "sec-ch-ua-mobile": "?0",
     "sec-ch-ua-platform": '"Linux"',
@@ -62,48 +62,62 @@ default_headers = {
 }
 
 
-def _build_cookie(cookies: list[dict]) -> str:
+def build_cookie(cookies: list[dict]) -> str:
     _cookie = [f'{i["name"]}={i["value"]}' for i in cookies]
     return "; ".join(_cookie)
 
 
-def get_data(
+def _build_projects_request(
     url: str,
     cookies: list[dict],
     offset: int,
-) -> tuple[list[Project], bool]:
+) -> tuple[str, dict[str, str]]:
     scheme, host, path, *_ = urlsplit(url)
     request_url = f"{scheme}://{host}{path}/projects?offset={offset}"
-    cookie_value = _build_cookie(cookies)
+    cookie_value = build_cookie(cookies)
     headers = {
         "referer": url,
         "cookie": cookie_value,
         "user-agent": user_agent.get_random_user_agent(),
     }
-    headers = default_headers | headers
-    response = requests.get(
-        url=request_url,
-        headers=headers,
-        verify=False,
-    )
-    response_data = response.json()
+    return request_url, default_headers | headers
+
+
+def _parse_projects_response(response_data: dict) -> tuple[list[Project], bool]:
     parsed_response = ProjectsResponse.parse_obj(response_data)
     if work := parsed_response.profile.active_section.work:
         return work.projects, work.has_more
     return [], False
 
 
-def load_img(url: str, cookies: list[dict]) -> bytes:
-    cookie_value = _build_cookie(cookies)
-    headers = {
-        "referer": "https://www.behance.net/",
-        "cookie": cookie_value,
-        "user-agent": user_agent.get_random_user_agent(),
-    }
-    try:
-        response = requests.get(url, headers=headers)
-    except requests.exceptions.RequestException as exc:
-        logging.exception("Error while downloading image for url %s", url)
-        raise ParsingException("Cant download image") from exc
-
-    return response.content
+async def fetch_projects(
+    url: str,
+    cookies: list[dict],
+    offset: int,
+    limiter: RateLimiter | None = None,
+) -> tuple[list[Project], bool]:
+    request_url, headers = _build_projects_request(url, cookies, offset)
+    if limiter:
+        await limiter.acquire(request_url)
+    with metrics.time_stage("listing_fetch"):
+        body = await _load_projects_page(request_url, headers)
+    return _parse_projects_response(json.loads(body))
+
+
+async def _load_projects_page(request_url: str, headers: dict[str, str]) -> bytes:
+    cache = http_cache.default_cache
+    entry = cache.get(request_url) if cache else None
+    cached_body = cache.read_body(entry) if entry else None
+    if cached_body is not None:
+        headers = headers | entry.headers
+    async with http_client.request(
+        "GET", request_url, headers=headers, ssl=False
+    ) as response:
+        if response.status == 304 and cached_body is not None:
+            cache.revalidated(entry, len(cached_body))
+            return cached_body
+        body = await response.read()
+        metrics.downloaded_bytes.inc(len(body), kind="listing")
+        if cache and response.status == 200:
+            cache.put(request_url, response.headers, body=body)
+    return body
@@ -0,0 +1,293 @@
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Protocol
+
+import bs4
+from bs4 import Tag
+
+from behance_parser.exceptions import ParsingException, UnknownElementException
+
+try:
+    from selectolax.lexbor import LexborHTMLParser, LexborNode
+except ImportError:
+    LexborHTMLParser = None
+
+logger = logging.getLogger(__name__)
+
+IMG_SELECTOR = "img[srcset]"
+TEXT_SELECTOR = "div[class*=main-text]"
+VIDEO_SELECTOR = "div[class*=project-module-video]"
+VIDEO_EMBED_SELECTOR = "div[class*=project-module-embed]"
+PROJECT_ITEMS = "div#project-modules>div[class*=Project-projectModuleContainer]"
+SLIDER_SELECTOR = "script[class*=js-lightbox-slide-content]"
+SKIP_ELEMENTS = [
+    "div[class*=Module-blockGridPointerEvents]",
+    "div.divider",
+    "div.module-separator",
+]
+SPECIAL_STRING_CONTAINERS = ("script", "style", "template", "rt", "rp")
+
+
+@dataclass
+class ProjectContent:
+    image_urls: list[str] = field(default_factory=list)
+    texts: dict[str, str] = field(default_factory=dict)
+    videos: dict[str, str] = field(default_factory=dict)
+
+    def add_text(self, parts: list[str]) -> None:
+        text = "\n".join(i.replace("\xa0", " ") for i in parts if i)
+        self.texts[hashlib.sha1(text.encode()).hexdigest()] = text
+
+    def add_video(self, url: str) -> None:
+        self.videos[hashlib.sha1(url.encode()).hexdigest()] = url
+
+
+class Engine(Protocol):
+    name: str
+
+    def extract(self, html: str) -> ProjectContent | None:
+        ...
+
+
+def select_srcset_url(srcset: str, max_width: int | None = None) -> str:
+    candidates = [i.split() for i in srcset.split(",") if i.strip()]
+    widths = [
+        (int(i[1][:-1]), i[0])
+        for i in candidates
+        if len(i) > 1 and i[1].endswith("w") and i[1][:-1].isdigit()
+    ]
+    if max_width is None or not widths:
+        return candidates[-1][0]
+    fitting = [i for i in widths if i[0] <= max_width]
+    return max(fitting)[1] if fitting else min(widths)[1]
+
+
+class BeautifulSoupEngine:
+    name = "bs4"
+
+    def __init__(self, max_image_width: int | None = None) -> None:
+        self._max_image_width = max_image_width
+
+    @staticmethod
+    def _select_items(html: str) -> list[Tag]:
+        soup = bs4.BeautifulSoup(html, "html.parser")
+        return [i for i in soup.select(PROJECT_ITEMS) if isinstance(i, Tag)]
+
+    def extract(self, html: str) -> ProjectContent | None:
+        items = self._select_items(html)
+        if not items:
+            return None
+        logger.info("Found %s items", len(items))
+        content = ProjectContent()
+        for tag in items:
+            self._extract_item(tag, content)
+        return content
+
+    def _extract_item(self, tag: Tag, content: ProjectContent) -> None:
+        if tag.select_one(IMG_SELECTOR):
+            content.image_urls.extend(self._extract_image_urls(tag))
+            return
+        if tag.select_one(TEXT_SELECTOR):
+            self._extract_text(tag, content)
+            return
+        if tag.select_one(VIDEO_SELECTOR) or tag.select_one(VIDEO_EMBED_SELECTOR):
+            self._extract_video(tag, content)
+            return
+        if tag.select_one(SLIDER_SELECTOR):
+            content.image_urls.extend(self._extract_slider_urls(tag))
+            return
+        if self._is_pointless_element(tag):
+            logger.info("Pointless element found, skip")
+            return
+        raise UnknownElementException(str(tag))
+
+    def _extract_image_urls(self, tag: Tag) -> list[str]:
+        images = tag.select(IMG_SELECTOR)
+        return [
+            select_srcset_url(img.attrs.get("srcset"), self._max_image_width)
+            for img in images
+        ]
+
+    def _extract_slider_urls(self, tag: Tag) -> list[str]:
+        urls = []
+        slider = tag.select_one(SLIDER_SELECTOR)
+        for slider_content in slider.contents:
+            if isinstance(slider_content, bs4.element.Script):
+                slider_content = bs4.BeautifulSoup(slider_content, "html.parser")
+            image = slider_content.select_one(IMG_SELECTOR)
+            if image:
+                urls.extend(self._extract_image_urls(slider_content))
+        return urls
+
+    @staticmethod
+    def _extract_text(tag: Tag, content: ProjectContent) -> None:
+        text = tag.select_one(TEXT_SELECTOR)
+        content.add_text([child.text.strip() for child in text.contents])
+
+    @staticmethod
+    def _extract_video(tag: Tag, content: ProjectContent) -> None:
+        video_container = tag.select_one(VIDEO_SELECTOR) or tag.select_one(
+            VIDEO_EMBED_SELECTOR
+        )
+        if "unsafe" in video_container.attrs["class"]:
+            return
+        iframe = video_container.select_one("iframe")
+        content.add_video(iframe.attrs.get("src"))
+
+    @staticmethod
+    def _is_pointless_element(tag: Tag) -> bool:
+        for selector in SKIP_ELEMENTS:
+            itm = tag.select_one(selector)
+            if itm:
+                return True
+        return False
+
+
+@dataclass
+class _Module:
+    images: list["LexborNode"] = field(default_factory=list)
+    text: "LexborNode | None" = None
+    video: "LexborNode | None" = None
+    embed: "LexborNode | None" = None
+    slider: "LexborNode | None" = None
+    pointless: bool = False
+
+
+class SelectolaxEngine:
+    name = "selectolax"
+
+    def __init__(self, max_image_width: int | None = None) -> None:
+        self._max_image_width = max_image_width
+
+    def extract(self, html: str) -> ProjectContent | None:
+        items = LexborHTMLParser(html).css(PROJECT_ITEMS)
+        if not items:
+            return None
+        logger.info("Found %s items", len(items))
+        content = ProjectContent()
+        for node in items:
+            self._extract_item(node, content)
+        return content
+
+    @staticmethod
+    def _classify(node: "LexborNode") -> _Module:
+        module = _Module()
+        descendants = node.traverse()
+        next(descendants)
+        for child in descendants:
+            tag = child.tag
+            if tag == "img":
+                if "srcset" in child.attributes:
+                    module.images.append(child)
+                continue
+            if tag not in ("div", "script"):
+                continue
+            class_attr = child.attributes.get("class") or ""
+            if tag == "script":
+                if module.slider is None and "js-lightbox-slide-content" in class_attr:
+                    module.slider = child
+                continue
+            if module.text is None and "main-text" in class_attr:
+                module.text = child
+            if module.video is None and "project-module-video" in class_attr:
+                module.video = child
+            if module.embed is None and "project-module-embed" in class_attr:
+                module.embed = child
+            if not module.pointless:
+                classes = class_attr.split()
+                module.pointless = (
+                    "Module-blockGridPointerEvents" in class_attr
+                    or "divider" in classes
+                    or "module-separator" in classes
+                )
+        return module
+
+    def _extract_item(self, node: "LexborNode", content: ProjectContent) -> None:
+        module = self._classify(node)
+        if module.images:
+            content.image_urls.extend(
+                select_srcset_url(img.attributes["srcset"], self._max_image_width)
+                for img in module.images
+            )
+            return
+        if module.text is not None:
+            content.add_text(
+                [self._text(child).strip() for child in self._children(module.text)]
+            )
+            return
+        if module.video is not None:
+            self._extract_video(module.video, content)
+            return
+        if module.embed is not None:
+            self._extract_video(module.embed, content)
+            return
+        if module.slider is not None:
+            slide = LexborHTMLParser(module.slider.text(deep=True))
+            content.image_urls.extend(
+                select_srcset_url(img.attributes["srcset"], self._max_image_width)
+                for img in slide.css(IMG_SELECTOR)
+            )
+            return
+        if module.pointless:
+            logger.info("Pointless element found, skip")
+            return
+        raise UnknownElementException(node.html)
+
+    @staticmethod
+    def _children(node: "LexborNode") -> list["LexborNode"]:
+        return [i for i in node.iter(include_text=True) if i.tag != "-comment"]
+
+    @staticmethod
+    def _text(node: "LexborNode") -> str:
+        if node.tag == "-text" or node.tag in SPECIAL_STRING_CONTAINERS:
+            return node.text(deep=True)
+        return "".join(
+            child.text(deep=False)
+            for child in node.traverse(include_text=True)
+            if child.tag == "-text"
+            and child.parent.tag not in SPECIAL_STRING_CONTAINERS
+        )
+
+    @staticmethod
+    def _extract_video(container: "LexborNode", content: ProjectContent) -> None:
+        if "unsafe" in (container.attributes.get("class") or "").split():
+            return
+        iframe = container.css_first("iframe")
+        content.add_video(iframe.attributes.get("src"))
+
+
+ENGINES: dict[str, type[Engine]] = {
+    BeautifulSoupEngine.name: BeautifulSoupEngine,
+    SelectolaxEngine.name: SelectolaxEngine,
+}
+
+
+def get_engine(name: str | None = None, max_image_width: int | None = None) -> Engine:
+    name = name or os.environ.get("BEHANCE_HTML_ENGINE", "auto")
+    if name == "auto":
+        name = SelectolaxEngine.name if LexborHTMLParser else BeautifulSoupEngine.name
+    if name == SelectolaxEngine.name and LexborHTMLParser is None:
+        logger.warning("selectolax is not installed, falling back to BeautifulSoup")
+        name = BeautifulSoupEngine.name
+    return ENGINES[name](max_image_width)
+
+
+_engines: dict[tuple[str, int | None], Engine] = {}
+
+
+def extract(
+    engine_name: str, html: str, max_image_width: int | None = None
+) -> ProjectContent | None:
+    key = (engine_name, max_image_width)
+    if key not in _engines:
+        _engines[key] = get_engine(engine_name, max_image_width)
+    try:
+        return _engines[key].extract(html)
+    except ParsingException:
+        raise
+    except Exception as exc:
+        # Malformed modules surface as AttributeError, IndexError and the like,
+        # report them as parse errors so callers can fall back or fail the task.
+        raise ParsingException(f"{type(exc).__name__}: {exc}") from exc
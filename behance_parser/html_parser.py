@@ -1,195 +1,628 @@
-import hashlib
+import asyncio
+import itertools
 import logging
-import time
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable
 
-import bs4
-from bs4 import Tag
+import aiohttp
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
 
-from behance_parser import fetcher, image_loader, parser, storage
-from behance_parser.exceptions import ParsingException
+from behance_parser import (
+    blob_store,
+    browser_pool,
+    dedup,
+    fetcher,
+    html_engines,
+    http_cache,
+    http_client,
+    image_loader,
+    metrics,
+    parser,
+    snapshots,
+    storage,
+    transcoder,
+)
+from behance_parser.exceptions import (
+    CircuitOpenException,
+    ParsingException,
+    RequestException,
+    UnknownElementException,
+)
+from behance_parser.fake_useragent import user_agent
 
 logger = logging.getLogger(__name__)
 
-IMG_SELECTOR = "img[srcset]"
-TEXT_SELECTOR = "div[class*=main-text]"
-VIDEO_SELECTOR = "div[class*=project-module-video]"
-VIDEO_EMBED_SELECTOR = "div[class*=project-module-embed]"
-PROJECT_ITEMS = "div#project-modules>div[class*=Project-projectModuleContainer]"
-SLIDER_SELECTOR = "script[class*=js-lightbox-slide-content]"
-SKIP_ELEMENTS = [
-    "div[class*=Module-blockGridPointerEvents]",
-    "div.divider",
-    "div.module-separator",
-]
-
-cookies: list[dict] | None = None
-
-
-def get_page_html(url: str) -> str:
-    driver = parser.get_driver()
-    driver.get(url)
-    time.sleep(1)
-    WebDriverWait(driver, 10).until(
-        ec.presence_of_element_located(
-            (By.XPATH, "//div[contains(@class, 'ProjectInfo-container')]")
+fetch_stats: Counter[str] = Counter()
+_fetch_stats_lock = threading.Lock()
+_last_cookies: list[dict] = []
+
+
+def get_page_html(url: str, driver: WebDriver) -> tuple[str, list[dict]]:
+    with metrics.time_stage("page_load"):
+        driver.get(url)
+    with metrics.time_stage("page_wait"):
+        WebDriverWait(driver, 10).until(
+            ec.presence_of_element_located(
+                (By.XPATH, "//div[contains(@class, 'ProjectInfo-container')]")
+            )
         )
-    )
-    global cookies
-    cookies = driver.get_cookies()
-    return driver.page_source
-
-
-def _parse_image(tag: Tag, task: storage.Task) -> None:
-    images = tag.select(IMG_SELECTOR)
-    for img in images:
-        srcset = img.attrs.get("srcset")
-        sizes = srcset.split(",")
-        sizes = [i for i in sizes if i]
-        higher_size_img_url = sizes[-1].strip().split(" ")[0]
-        file_name = higher_size_img_url.split("/")[-1]
-        if storage.is_image_exist(file_name.lower(), task.id):
-            return
-        img_data = fetcher.load_img(
-            url=higher_size_img_url,
-            cookies=cookies,
+    return driver.page_source, driver.get_cookies()
+
+
+async def _fetch_page_html(url: str, cookies: list[dict]) -> str | None:
+    headers = {
+        "referer": parser.behance_url,
+        "cookie": fetcher.build_cookie(cookies),
+        "user-agent": user_agent.get_random_user_agent(),
+    }
+    try:
+        async with http_client.request("GET", url, headers=headers) as response:
+            if response.status != 200:
+                logger.info("Got status %s for %s over HTTP", response.status, url)
+                return None
+            metrics.downloaded_bytes.inc(len(await response.read()), kind="page")
+            return await response.text()
+    except (RequestException, aiohttp.ClientError, asyncio.TimeoutError):
+        logger.warning("Error while fetching %s over HTTP", url, exc_info=True)
+        return None
+
+
+def _count_fetch(path: str) -> None:
+    with _fetch_stats_lock:
+        fetch_stats[path] += 1
+    metrics.projects.inc(result=path)
+
+
+def fetch_page_html(url: str) -> tuple[str | None, list[dict]]:
+    cookies = _last_cookies
+    with metrics.time_stage("page_fetch"):
+        return http_client.run(_fetch_page_html(url, cookies)), cookies
+
+
+def render_page_html(
+    url: str, pool: browser_pool.BrowserPool
+) -> tuple[str, list[dict]]:
+    global _last_cookies
+    with pool.lease() as driver:
+        html, cookies = get_page_html(url, driver)
+    _last_cookies = cookies
+    return html, cookies
+
+
+def _pending_downloads(
+    task_id: int, image_index: dedup.ImageIndex | None
+) -> dict[str, int]:
+    pending = {image.url: image.id for image in storage.get_pending_images(task_id)}
+    if image_index is not None:
+        for url, image_id in list(pending.items()):
+            if blob := image_index.find_family(url):
+                storage.mark_image_done(image_id, blob)
+                del pending[url]
+    return pending
+
+
+def _store_image(
+    image_id: int, blob: blob_store.Blob, image_index: dedup.ImageIndex | None
+) -> None:
+    phash = None
+    if image_index is not None:
+        with metrics.time_stage("dedup"):
+            blob, phash = image_index.deduplicate(blob)
+    storage.mark_image_done(image_id, blob, phash)
+
+
+def _log_failed_images(task_id: int, failed: int, total: int) -> None:
+    if failed:
+        logger.warning(
+            "Failed to load %s of %s images for project %s", failed, total, task_id
         )
-        storage.store_image(
-            uuid=file_name,
-            data=img_data,
-            task=task,
+
+
+def _store_content(task: storage.Task, content: html_engines.ProjectContent) -> None:
+    with metrics.time_stage("store"):
+        storage.store_project_content(
+            task,
+            texts=content.texts,
+            videos=content.videos,
+            images={},
+            image_urls=content.image_urls,
         )
 
 
-def _extract_image_urls(tag: Tag) -> list[str]:
-    images = tag.select(IMG_SELECTOR)
-    urls = []
-    for img in images:
-        srcset = img.attrs.get("srcset")
-        sizes = srcset.split(",")
-        sizes = [i for i in sizes if i]
-        higher_size_img_url = sizes[-1].strip().split(" ")[0]
-        urls.append(higher_size_img_url)
-    return urls
-
-
-def _extract_slider_urls(tag: Tag) -> list[str]:
-    urls = []
-    slider = tag.select_one(SLIDER_SELECTOR)
-    for slider_content in slider.contents:
-        if isinstance(slider_content, bs4.element.Script):
-            slider_content = bs4.BeautifulSoup(slider_content, "html.parser")
-        image = slider_content.select_one(IMG_SELECTOR)
-        if image:
-            urls.extend(_extract_image_urls(slider_content))
-    return urls
-
-
-def _parse_text(tag: Tag, task: storage.Task) -> None:
-    text = tag.select_one(TEXT_SELECTOR)
-    extracted_content: list[str] = []
-    for child in text.contents:
-        content = child.text.strip()
-        if content:
-            content = content.replace(" ", " ")
-            extracted_content.append(content)
-    result = "\n".join(extracted_content)
-    uuid = hashlib.sha1(result.encode()).hexdigest()
-    storage.store_text(
-        uuid=uuid,
-        text=result,
-        task=task,
-    )
+def _finalize(task: storage.Task) -> None:
+    if storage.finalize_task(task):
+        logger.info("Completed processing for project: %s", task.id)
+    elif task.error:
+        metrics.projects.inc(result="failed")
+        logger.warning(
+            "Project %s has images that failed %s times, marked as failed",
+            task.id,
+            storage.MAX_IMAGE_ATTEMPTS,
+        )
+    else:
+        logger.info(
+            "Project %s still has images to download, retrying after %s",
+            task.id,
+            task.lease_expires_at,
+        )
 
 
-def _parse_video(tag: Tag, task: storage.Task) -> None:
-    video_container = tag.select_one(VIDEO_SELECTOR) or tag.select_one(
-        VIDEO_EMBED_SELECTOR
-    )
-    if "unsafe" in video_container.attrs["class"]:
-        return
-    iframe = video_container.select_one("iframe")
-    url = iframe.attrs.get("src")
-    uuid = hashlib.sha1(url.encode()).hexdigest()
-    storage.store_video(
-        uuid=uuid,
-        link=url,
-        task=task,
-    )
+def store_downloads(
+    task_id: int,
+    downloads: dict[int, Future[blob_store.Blob]],
+    image_index: dedup.ImageIndex | None = None,
+) -> None:
+    failed = 0
+    for image_id, download in downloads.items():
+        count_attempt = True
+        try:
+            blob = download.result()
+        except CircuitOpenException as exc:
+            logger.info("Deferring image %s of project %s: %s", image_id, task_id, exc)
+            error, count_attempt = repr(exc), False
+        except image_loader.DOWNLOAD_ERRORS as exc:
+            logger.warning(
+                "Can't load image %s of project %s: %r", image_id, task_id, exc
+            )
+            error = repr(exc)
+        except Exception as exc:
+            logger.exception(
+                "Error while loading image %s of project %s", image_id, task_id
+            )
+            error = repr(exc)
+        else:
+            _store_image(image_id, blob, image_index)
+            continue
+        metrics.images.inc(result="failed")
+        storage.mark_image_failed(image_id, error, count_attempt=count_attempt)
+        failed += 1
+    _log_failed_images(task_id, failed, len(downloads))
+    _finalize(storage.get_task_by_id(task_id))
+
+
+@dataclass
+class _Job:
+    task_id: int
+    url: str
+    html: str = ""
+    cookies: list[dict] = field(default_factory=list)
+    source: str = ""
+    fetched_at: datetime | None = None
+    content: html_engines.ProjectContent | None = None
+    downloads: dict[int, Future[blob_store.Blob]] = field(default_factory=dict)
+
 
+class _Pipeline:
+    def __init__(
+        self,
+        pool: browser_pool.BrowserPool,
+        engine_name: str,
+        http_first: bool,
+        fetchers: int,
+        parsers: int,
+        writers: int,
+        fetch_queue_size: int,
+        parse_queue_size: int,
+        write_queue_size: int,
+        snapshot_ttl: timedelta | None,
+        max_image_width: int | None,
+        transcode: transcoder.TranscodeOptions | None,
+        image_index: dedup.ImageIndex | None,
+        download_concurrency: int,
+        adaptive_downloads: bool,
+        download_budget: int,
+    ) -> None:
+        self._pool = pool
+        self._engine_name = engine_name
+        self._max_image_width = max_image_width
+        self._image_index = image_index
+        self._http_first = http_first
+        self._snapshot_ttl = snapshot_ttl
+        self._fetch_queue: queue.Queue[_Job | None] = queue.Queue(fetch_queue_size)
+        self._render_queue: queue.Queue[_Job | None] = queue.Queue()
+        self._parse_queue: queue.Queue[_Job | None] = queue.Queue(parse_queue_size)
+        self._write_queue: queue.Queue[_Job | None] = queue.Queue(write_queue_size)
+        self._finish_queue: queue.Queue[_Job | None] = queue.Queue()
+        self._queues = dict(
+            fetch=self._fetch_queue,
+            render=self._render_queue,
+            parse=self._parse_queue,
+            write=self._write_queue,
+            finish=self._finish_queue,
+        )
+        self._stages = [
+            (self._fetch_queue, self._fetch, fetchers),
+            (self._render_queue, self._render, pool.size),
+            (self._parse_queue, self._parse, parsers),
+            (self._write_queue, self._write, writers),
+            (self._finish_queue, self._finish, writers),
+        ]
+        self._executor = ProcessPoolExecutor(
+            max_workers=parsers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._transcoder = None
+        if transcode and transcoder.is_available(transcode):
+            self._transcoder = transcoder.Transcoder(
+                transcode, self._executor, blob_store.default_store
+            )
+        self._downloads = image_loader.DownloadService(
+            concurrency=download_concurrency,
+            adaptive=adaptive_downloads,
+            max_pending_bytes=download_budget,
+            transcoder=self._transcoder,
+        )
+        self._capacity = fetch_queue_size + parse_queue_size + write_queue_size
+        self._pending = 0
+        self._idle = threading.Condition()
 
-def _is_pointless_element(tag: Tag) -> bool:
-    for selector in SKIP_ELEMENTS:
-        itm = tag.select_one(selector)
-        if itm:
-            return True
-    return False
-
-
-def _parse_slider(tag: Tag, task: storage.Task) -> None:
-    slider = tag.select_one(SLIDER_SELECTOR)
-    for slider_content in slider.contents:
-        if isinstance(slider_content, bs4.element.Script):
-            slider_content = bs4.BeautifulSoup(slider_content, "html.parser")
-        image = slider_content.select_one(IMG_SELECTOR)
-        if image:
-            _parse_image(slider_content, task)
-
-
-def parse_project(task: storage.Task) -> None:
-    logger.info("Processing project: %s", task.id)
-    html = get_page_html(task.url)
-    soup = bs4.BeautifulSoup(html, "html.parser")
-    content = soup.select(PROJECT_ITEMS)
-    if not content:
-        logger.warning("Can't find project-modules container")
-        storage.set_task_error_status(task, is_error=True)
-        return
-    content = [i for i in content if isinstance(i, Tag)]
-    logger.info("Found %s items", len(content))
-    urls = []
-    for tag in content:
+    def run(self, claim: Callable[[int], list[storage.Task]]) -> None:
+        threads = [
+            [
+                threading.Thread(
+                    target=self._work,
+                    args=(jobs, handle),
+                    name=f"{handle.__name__.strip('_')}-{i}",
+                    daemon=True,
+                )
+                for i in range(count)
+            ]
+            for jobs, handle, count in self._stages
+        ]
+        for thread in itertools.chain.from_iterable(threads):
+            thread.start()
+        for name, jobs in self._queues.items():
+            metrics.queue_depth.set_function(jobs.qsize, queue=name)
+        metrics.queue_depth.set_function(lambda: self._pending, queue="in_flight")
         try:
-            image = tag.select_one(IMG_SELECTOR)
-            if image:
-                urls.extend(_extract_image_urls(tag))
-                # _parse_image(tag, task)
-                continue
-            text = tag.select_one(TEXT_SELECTOR)
-            if text:
-                _parse_text(tag, task)
-                continue
-            video = tag.select_one(VIDEO_SELECTOR) or tag.select_one(
-                VIDEO_EMBED_SELECTOR
+            while True:
+                with self._idle:
+                    self._idle.wait_for(lambda: self._pending < self._capacity)
+                    free = self._capacity - self._pending
+                tasks = claim(free)
+                if not tasks:
+                    with self._idle:
+                        if not self._pending:
+                            break
+                        self._idle.wait_for(lambda: not self._pending)
+                    continue
+                with self._idle:
+                    self._pending += len(tasks)
+                for task in tasks:
+                    self._fetch_queue.put(_Job(task_id=task.id, url=task.url))
+            for (jobs, _, _), stage_threads in zip(self._stages, threads):
+                for _ in stage_threads:
+                    jobs.put(None)
+                for thread in stage_threads:
+                    thread.join()
+        finally:
+            for name in [*self._queues, "in_flight"]:
+                metrics.queue_depth.remove_function(queue=name)
+            self._downloads.close()
+            self._executor.shutdown(cancel_futures=True)
+
+    def _work(
+        self, jobs: queue.Queue[_Job | None], handle: Callable[[_Job], None]
+    ) -> None:
+        while (job := jobs.get()) is not None:
+            try:
+                handle(job)
+            except WebDriverException:
+                logger.exception(
+                    "Browser error while processing project: %s", job.task_id
+                )
+                self._fail(job)
+            except Exception:
+                logger.exception(
+                    "Unexpected error while processing project: %s", job.task_id
+                )
+                self._fail(job)
+            finally:
+                storage.db_session.remove()
+
+    def _done(self) -> None:
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def _fail(self, job: _Job) -> None:
+        metrics.projects.inc(result="failed")
+        try:
+            storage.db_session.rollback()
+            storage.set_task_error_status(
+                storage.get_task_by_id(job.task_id), is_error=True
             )
-            if video:
-                _parse_video(tag, task)
-                continue
-            slider = tag.select_one(SLIDER_SELECTOR)
-            if slider:
-                urls.extend(_extract_slider_urls(tag))
-                # _parse_slider(tag, task)
-                continue
-            if _is_pointless_element(tag):
-                logger.info("Pointless element found, skip")
-                continue
-            logger.warning("Unknown tag found %s", tag)
-            storage.set_task_error_status(task, is_error=True)
+        except Exception:
+            logger.exception("Can't mark project %s as failed", job.task_id)
+        finally:
+            self._done()
+
+    def _fetch(self, job: _Job) -> None:
+        logger.info("Processing project: %s", job.task_id)
+        if storage.has_pending_images(job.task_id):
+            job.cookies = _last_cookies
+            _count_fetch("resumed")
+            self._write_queue.put(job)
             return
-        except ParsingException:
-            logger.warning("Error while parsing tag %s", tag.prettify())
-            storage.set_task_error_status(task, is_error=True)
+        if self._snapshot_ttl and (
+            snapshot := storage.get_snapshot(job.task_id, self._snapshot_ttl)
+        ):
+            job.html, job.cookies = snapshots.decompress(snapshot.html), _last_cookies
+            job.source, job.fetched_at = "snapshot", snapshot.fetched_at
+            self._parse_queue.put(job)
+            return
+        if self._http_first:
+            html, job.cookies = fetch_page_html(job.url)
+            if html:
+                job.html, job.source = html, "http"
+                job.fetched_at = datetime.utcnow()
+                self._parse_queue.put(job)
+                return
+        self._render_queue.put(job)
+
+    def _render(self, job: _Job) -> None:
+        job.html, job.cookies = render_page_html(job.url, self._pool)
+        job.source, job.fetched_at = "browser", datetime.utcnow()
+        self._parse_queue.put(job)
+
+    def _parse(self, job: _Job) -> None:
+        html, job.html = job.html, ""
+        future = self._executor.submit(
+            html_engines.extract, self._engine_name, html, self._max_image_width
+        )
+        try:
+            with metrics.time_stage("parse"):
+                job.content = future.result()
+        except ParsingException as exc:
+            error = exc
+        else:
+            error = None
+        if (error or job.content is None) and job.source != "browser":
+            logger.info("Can't parse %s fetched from %s", job.url, job.source)
+            self._render_queue.put(job)
             return
-    images = image_loader.ImagesLoader(urls, cookies).load()
-    for file_name, file_data in images.items():
-        storage.store_image(file_name, file_data, task)
-    storage.set_task_parsing_status(task, is_parsed=True)
-    logger.info("Completed processing for project: %s", task.id)
+        if self._snapshot_ttl and job.source != "snapshot":
+            storage.store_snapshot(
+                job.task_id, snapshots.compress(html), job.fetched_at
+            )
+        if isinstance(error, UnknownElementException):
+            logger.warning("Unknown tag found %s", error)
+            self._fail(job)
+        elif error:
+            logger.warning(
+                "Error while parsing project %s", job.task_id, exc_info=error
+            )
+            self._fail(job)
+        elif job.content is None:
+            logger.warning("Can't find project-modules container")
+            self._fail(job)
+        else:
+            _count_fetch(job.source)
+            self._write_queue.put(job)
+
+    def _write(self, job: _Job) -> None:
+        task = storage.get_task_by_id(job.task_id)
+        if job.content is not None:
+            _store_content(task, job.content)
+        pending = _pending_downloads(task.id, self._image_index)
+        job.downloads = {
+            image_id: self._downloads.submit(url, job.cookies)
+            for url, image_id in pending.items()
+        }
+        self._finish_queue.put(job)
+
+    def _finish(self, job: _Job) -> None:
+        store_downloads(job.task_id, job.downloads, self._image_index)
+        self._done()
 
 
-def process_tasks():
-    while tasks := storage.get_next_tasks_for_parsing():
-        for task in tasks:
-            parse_project(task)
+def _lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def process_tasks(
+    browsers: int = 1,
+    recycle_after: int = 50,
+    headless: bool = True,
+    http_first: bool = True,
+    lease_seconds: int = 900,
+    html_engine: str | None = None,
+    fetchers: int = 4,
+    parsers: int | None = None,
+    writers: int = 2,
+    fetch_queue_size: int = 16,
+    parse_queue_size: int = 16,
+    write_queue_size: int = 16,
+    snapshot_ttl: timedelta | None = None,
+    max_image_width: int | None = None,
+    transcode: str | None = None,
+    transcode_quality: int = 80,
+    dedup_distance: int | None = None,
+    download_concurrency: int = 16,
+    adaptive_downloads: bool = True,
+    download_budget: int = 256 * 1024 * 1024,
+):
+    owner = _lease_owner()
+    engine = html_engines.get_engine(html_engine)
+    parsers = parsers or os.cpu_count() or 1
+    logger.info(
+        "Parsing project pages with %s engine in %s processes", engine.name, parsers
+    )
+    if requeued := storage.requeue_expired_leases():
+        logger.info("Requeued %s tasks with expired leases", requeued)
+    if snapshot_ttl and (expired := storage.delete_expired_snapshots(snapshot_ttl)):
+        logger.info("Deleted %s expired page snapshots", expired)
+    pool = browser_pool.BrowserPool(
+        size=browsers,
+        driver_factory=partial(parser.create_driver, headless=headless),
+        max_pages=recycle_after,
+    )
+    transcode_options = None
+    if transcode:
+        transcode_options = transcoder.TranscodeOptions(
+            format=transcode, quality=transcode_quality, max_width=max_image_width
+        )
+    image_index = None
+    if dedup_distance is not None:
+        image_index = dedup.ImageIndex.load(max_distance=dedup_distance)
+    pipeline = _Pipeline(
+        pool,
+        engine_name=engine.name,
+        http_first=http_first,
+        fetchers=fetchers,
+        parsers=parsers,
+        writers=writers,
+        fetch_queue_size=fetch_queue_size,
+        parse_queue_size=parse_queue_size,
+        write_queue_size=write_queue_size,
+        snapshot_ttl=snapshot_ttl,
+        max_image_width=max_image_width,
+        transcode=transcode_options,
+        image_index=image_index,
+        download_concurrency=download_concurrency,
+        adaptive_downloads=adaptive_downloads,
+        download_budget=download_budget,
+    )
+    try:
+        pipeline.run(
+            partial(
+                storage.claim_tasks_for_parsing,
+                owner,
+                lease_seconds=lease_seconds,
+            )
+        )
+    finally:
+        storage.db_session.remove()
+        pool.close()
+    logger.info(
+        "Project pages fetched over HTTP: %s, with browser: %s, from snapshots: %s, "
+        "resumed image downloads: %s",
+        fetch_stats["http"],
+        fetch_stats["browser"],
+        fetch_stats["snapshot"],
+        fetch_stats["resumed"],
+    )
+    if http_cache.default_cache:
+        http_cache.default_cache.log_stats()
+    if image_index is not None:
+        image_index.log_stats()
+
+
+def _reparse_result(task_id: int, future: Future) -> html_engines.ProjectContent | None:
+    try:
+        content = future.result()
+    except UnknownElementException as exc:
+        logger.warning("Unknown tag found in project %s: %s", task_id, exc)
+        return None
+    except ParsingException:
+        logger.warning("Error while parsing project %s", task_id, exc_info=True)
+        return None
+    if content is None:
+        logger.warning("Can't find project-modules container in project %s", task_id)
+    return content
+
+
+def reparse_tasks(
+    html_engine: str | None = None,
+    parsers: int | None = None,
+    snapshot_ttl: timedelta = snapshots.DEFAULT_TTL,
+    failed_only: bool = True,
+    batch_size: int = 100,
+    max_image_width: int | None = None,
+) -> Counter[str]:
+    engine_name = html_engines.get_engine(html_engine).name
+    task_ids = storage.get_snapshot_task_ids(snapshot_ttl, errors_only=failed_only)
+    logger.info("Re-parsing %s projects from snapshots", len(task_ids))
+    stats: Counter[str] = Counter()
+    with ProcessPoolExecutor(
+        max_workers=parsers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        for i in range(0, len(task_ids), batch_size):
+            futures = {
+                snapshot.task_id: executor.submit(
+                    snapshots.extract, engine_name, snapshot.html, max_image_width
+                )
+                for snapshot in storage.get_snapshots(task_ids[i : i + batch_size])
+            }
+            storage.db_session.expunge_all()
+            for task_id, future in futures.items():
+                with metrics.time_stage("parse"):
+                    content = _reparse_result(task_id, future)
+                task = storage.get_task_by_id(task_id)
+                if content is None:
+                    storage.set_task_error_status(task, is_error=True)
+                    stats["failed"] += 1
+                    continue
+                storage.store_project_content(
+                    task,
+                    texts=content.texts,
+                    videos=content.videos,
+                    images={},
+                    image_urls=content.image_urls,
+                )
+                storage.reset_failed_images(task_id)
+                task.error = False
+                if storage.finalize_task(task):
+                    stats["parsed"] += 1
+                else:
+                    stats["failed" if task.error else "queued"] += 1
+    logger.info(
+        "Re-parsed projects: %s complete, %s queued for image downloads, %s failed",
+        stats["parsed"],
+        stats["queued"],
+        stats["failed"],
+    )
+    return stats
+
+
+def _run_worker(metrics_file: str | None, profile: bool, kwargs: dict) -> None:
+    try:
+        process_tasks(**kwargs)
+    finally:
+        if metrics_file:
+            metrics.write_file(metrics_file)
+        if profile:
+            logger.info(
+                "Profile of %s:\n%s",
+                multiprocessing.current_process().name,
+                metrics.format_profile(),
+            )
+
+
+def run_workers(
+    workers: int,
+    metrics_file: str | None = None,
+    profile: bool = False,
+    **kwargs,
+) -> None:
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_run_worker,
+            args=(f"{metrics_file}.{i}" if metrics_file else None, profile, kwargs),
+            name=f"process-tasks-{i}",
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logger.error(
+                "Worker %s exited with code %s", process.name, process.exitcode
+            )
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Mapping
+
+from behance_parser.blob_store import Blob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = timedelta(days=30)
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    url: str
+    etag: str | None
+    last_modified: str | None
+    blob: Blob | None = None
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["if-none-match"] = self.etag
+        if self.last_modified:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class HttpCache:
+    def __init__(
+        self,
+        root: str | Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: timedelta = DEFAULT_MAX_AGE,
+    ) -> None:
+        self._root = Path(root)
+        self._max_bytes = max_bytes
+        self._max_age = max_age.total_seconds()
+        self._written = 0
+        self._evicted = False
+        self._lock = threading.Lock()
+        self.stats: Counter[str] = Counter()
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = self._root / key[:2] / key
+        return base.with_suffix(".json"), base.with_suffix(".body")
+
+    def get(self, url: str) -> CacheEntry | None:
+        meta_path, _ = self._paths(url)
+        try:
+            if time.time() - meta_path.stat().st_mtime > self._max_age:
+                return None
+            data = json.loads(meta_path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        blob = Blob(**data["blob"]) if data.get("blob") else None
+        return CacheEntry(
+            url=url,
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+            blob=blob,
+        )
+
+    def read_body(self, entry: CacheEntry) -> bytes | None:
+        _, body_path = self._paths(entry.url)
+        try:
+            return body_path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        body: bytes | None = None,
+        blob: Blob | None = None,
+    ) -> None:
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        if body is not None:
+            _write_atomic(body_path, body)
+        meta = json.dumps(
+            dict(
+                url=url,
+                etag=etag,
+                last_modified=last_modified,
+                blob=asdict(blob) if blob else None,
+            )
+        ).encode()
+        _write_atomic(meta_path, meta)
+        self.stats["stored"] += 1
+        self._account(len(meta) + len(body or b""))
+
+    def revalidated(self, entry: CacheEntry, size: int) -> None:
+        for path in self._paths(entry.url):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        self.stats["revalidated"] += 1
+        self.stats["bytes_saved"] += size
+
+    def _account(self, size: int) -> None:
+        with self._lock:
+            self._written += size
+            if self._evicted and self._written < self._max_bytes // 10:
+                return
+            self._written = 0
+            self._evicted = True
+        self.evict()
+
+    def evict(self) -> int:
+        entries = []
+        for meta_path in self._root.glob("*/*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                stat = meta_path.stat()
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            if body_path.exists():
+                size += body_path.stat().st_size
+            entries.append((stat.st_mtime, size, meta_path, body_path))
+        entries.sort()
+        now = time.time()
+        total = sum(i[1] for i in entries)
+        removed = 0
+        for mtime, size, meta_path, body_path in entries:
+            if now - mtime <= self._max_age and total <= self._max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Evicted %s HTTP cache entries", removed)
+        return removed
+
+    def log_stats(self) -> None:
+        logger.info(
+            "HTTP cache revalidated %s responses (%.1f MB saved), stored %s",
+            self.stats["revalidated"],
+            self.stats["bytes_saved"] / 1024 / 1024,
+            self.stats["stored"],
+        )
+
+
+def _default_cache() -> HttpCache | None:
+    root = os.environ.get("BEHANCE_HTTP_CACHE_DIR", "http-cache")
+    if not root:
+        return None
+    return HttpCache(
+        root,
+        max_bytes=int(os.environ.get("BEHANCE_HTTP_CACHE_MB", 1024)) * 1024 * 1024,
+        max_age=timedelta(days=int(os.environ.get("BEHANCE_HTTP_CACHE_DAYS", 30))),
+    )
+
+
+default_cache = _default_cache()
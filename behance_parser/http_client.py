@@ -0,0 +1,255 @@
+import asyncio
+import atexit
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Coroutine, TypeVar
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from behance_parser import metrics
+from behance_parser.exceptions import CircuitOpenException, RequestException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+BREAKER_STATUSES = frozenset({500, 502, 503, 504})
+THROTTLE_STATUSES = frozenset({429, 503})
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+connection_stats = {"created": 0, "reused": 0}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    max_retry_after: float = 120.0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return (
+            self._opened_at is not None
+            and time.monotonic() - self._opened_at < self._reset_timeout
+        )
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+@dataclass
+class _Client:
+    loop: asyncio.AbstractEventLoop
+    session: aiohttp.ClientSession | None = None
+
+
+_local = threading.local()
+_clients: list[_Client] = []
+_clients_lock = threading.Lock()
+
+
+async def _on_connection_create_end(session, context, params) -> None:
+    connection_stats["created"] += 1
+
+
+async def _on_connection_reuseconn(session, context, params) -> None:
+    connection_stats["reused"] += 1
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return trace_config
+
+
+def _get_client() -> _Client:
+    client = getattr(_local, "client", None)
+    if not client:
+        client = _Client(loop=asyncio.new_event_loop())
+        _local.client = client
+        with _clients_lock:
+            _clients.append(client)
+    return client
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    return _get_client().loop
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    return get_loop().run_until_complete(coro)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    client = _get_client()
+    if not client.session:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        client.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=None, connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+            ),
+            trace_configs=[_build_trace_config()],
+        )
+    return client.session
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(
+                BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+            )
+        return _breakers[host]
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+async def _send(
+    method: str,
+    url: str,
+    retry: RetryPolicy,
+    on_throttle: Callable[[], None] | None,
+    **kwargs,
+) -> aiohttp.ClientResponse:
+    host = urlsplit(url).netloc
+    breaker = get_breaker(host)
+    session = await get_session()
+    for attempt in range(retry.attempts):
+        if breaker.is_open:
+            raise CircuitOpenException(f"Circuit for {host} is open")
+        last_attempt = attempt == retry.attempts - 1
+        try:
+            response = await session.request(method, url, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            metrics.http_errors.inc()
+            breaker.record_failure()
+            if on_throttle and isinstance(exc, asyncio.TimeoutError):
+                on_throttle()
+            if last_attempt:
+                raise RequestException(f"{method} {url} failed: {exc!r}") from exc
+            delay = retry.backoff(attempt)
+            logger.info("%s %s failed, retrying in %.1fs", method, url, delay)
+            await asyncio.sleep(delay)
+            continue
+        metrics.http_responses.inc(status=str(response.status))
+        if response.status not in RETRY_STATUSES:
+            breaker.record_success()
+            return response
+        response.release()
+        if on_throttle and response.status in THROTTLE_STATUSES:
+            on_throttle()
+        if response.status in BREAKER_STATUSES:
+            breaker.record_failure()
+        if last_attempt:
+            raise RequestException(f"{method} {url} got status {response.status}")
+        delay = _retry_after(response)
+        if delay is None:
+            delay = retry.backoff(attempt)
+        delay = min(delay, retry.max_retry_after)
+        logger.info(
+            "%s %s got status %s, retrying in %.1fs",
+            method,
+            url,
+            response.status,
+            delay,
+        )
+        await asyncio.sleep(delay)
+    raise RequestException(f"{method} {url} was not attempted")
+
+
+@asynccontextmanager
+async def request(
+    method: str,
+    url: str,
+    retry: RetryPolicy | None = None,
+    on_throttle: Callable[[], None] | None = None,
+    **kwargs,
+) -> AsyncIterator[aiohttp.ClientResponse]:
+    response = await _send(method, url, retry or DEFAULT_RETRY, on_throttle, **kwargs)
+    try:
+        yield response
+    finally:
+        response.release()
+
+
+def log_connection_stats() -> None:
+    logger.info(
+        "HTTP connections created: %s, reused: %s",
+        connection_stats["created"],
+        connection_stats["reused"],
+    )
+
+
+def close() -> None:
+    with _clients_lock:
+        clients = list(_clients)
+        _clients.clear()
+    for client in clients:
+        if client.loop.is_running():
+            continue
+        if client.session:
+            client.loop.run_until_complete(client.session.close())
+        client.loop.close()
+    _local.client = None
+
+
+atexit.register(close)
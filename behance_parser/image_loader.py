@@ -1,64 +1,189 @@
 import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Callable
 
 import aiohttp
 
+from behance_parser import http_client, metrics
+from behance_parser.blob_store import Blob, BlobStore, default_store
+from behance_parser.exceptions import RequestException
+from behance_parser.http_cache import CacheEntry, HttpCache, default_cache
+from behance_parser.rate_limit import ConcurrencyLimit
+from behance_parser.transcoder import Transcoder
 from behance_parser.fake_useragent import user_agent
 
+logger = logging.getLogger(__name__)
 
-class ImagesLoader:
-    def __init__(self, urls: list[str], cookies: list[dict], threads: int = 5) -> None:
-        self._threads = threads
-        self._urls = urls
-        self._cookies = self._build_cookies(cookies)
-        self._tmp_result = asyncio.Queue()
-        self._tasks = asyncio.Queue()
-        self._results = dict()
-        for url in urls:
-            self._tasks.put_nowait(url)
-
-    @staticmethod
-    def _build_cookies(cookies: list[dict[str, str]]):
-        cookies_list = [f'{i["name"]}={i["value"]}' for i in cookies]
-        return "; ".join(cookies_list)
-
-    async def _load_image(self, url: str) -> bytes:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=url,
-                headers={
-                    "user-agent": user_agent.get_random_user_agent(),
-                    "cookies": self._cookies,
-                },
-            ) as response:
+DOWNLOAD_ERRORS = (RequestException, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def build_cookies(cookies: list[dict[str, str]]) -> str:
+    cookies_list = [f'{i["name"]}={i["value"]}' for i in cookies]
+    return "; ".join(cookies_list)
+
+
+class ImageDownloader:
+    def __init__(
+        self,
+        chunk_size: int = 64 * 1024,
+        store: BlobStore = default_store,
+        cache: HttpCache | None = default_cache,
+        transcoder: Transcoder | None = None,
+    ) -> None:
+        self._chunk_size = chunk_size
+        self._store = store
+        self._cache = cache
+        self._transcoder = transcoder
+
+    def _cached_blob(self, url: str) -> CacheEntry | None:
+        entry = self._cache.get(url) if self._cache else None
+        if entry and entry.blob and self._store.exists(entry.blob.hash):
+            return entry
+        return None
+
+    async def load(
+        self, url: str, cookies: str, on_throttle: Callable[[], None] | None = None
+    ) -> Blob:
+        with metrics.time_stage("image_download"):
+            return await self._load(url, cookies, on_throttle)
+
+    async def _load(
+        self, url: str, cookies: str, on_throttle: Callable[[], None] | None
+    ) -> Blob:
+        headers = {
+            "user-agent": user_agent.get_random_user_agent(),
+            "cookies": cookies,
+        }
+        if entry := self._cached_blob(url):
+            headers |= entry.headers
+        async with http_client.request(
+            "GET", url, headers=headers, on_throttle=on_throttle
+        ) as response:
+            if response.status == 304 and entry:
+                self._cache.revalidated(entry, entry.blob.size)
+                metrics.images.inc(result="not_modified")
+                return entry.blob
+            if response.status != 200:
+                raise RequestException(f"Got status {response.status} for {url}")
+            if self._transcoder:
                 data = await response.read()
-                return data
-
-    async def _consumer(self):
-        while True:
-            url = await self._tasks.get()
-            file_data = await self._load_image(url)
-            file_name = url.split("/")[-1]
-            self._tmp_result.put_nowait((file_name, file_data))
-            self._tasks.task_done()
-
-    async def _process(self):
-        tasks = []
-        for i in range(self._threads):
-            task = asyncio.create_task(self._consumer())
-            tasks.append(task)
-
-        await self._tasks.join()
-        for task in tasks:
-            task.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
-
-    def _get_results(self) -> dict[str, bytes]:
-        res = dict()
-        while not self._tmp_result.empty():
-            file_name, file_data = self._tmp_result.get_nowait()
-            res[file_name] = file_data
-        return res
-
-    def load(self) -> dict[str, bytes]:
-        asyncio.run(self._process())
-        return self._get_results()
+                metrics.downloaded_bytes.inc(len(data), kind="image")
+                blob = await asyncio.wrap_future(self._transcoder.submit(data))
+            else:
+                with self._store.open_writer() as writer:
+                    async for chunk in response.content.iter_chunked(
+                        self._chunk_size
+                    ):
+                        writer.write(chunk)
+                    blob = writer.commit()
+                metrics.downloaded_bytes.inc(blob.size, kind="image")
+            metrics.images.inc(result="downloaded")
+            if self._cache:
+                self._cache.put(url, response.headers, blob=blob)
+            return blob
+
+
+class DownloadService:
+    def __init__(
+        self,
+        concurrency: int = 16,
+        adaptive: bool = True,
+        max_pending_bytes: int = 256 * 1024 * 1024,
+        expected_size: int = 512 * 1024,
+        chunk_size: int = 64 * 1024,
+        store: BlobStore = default_store,
+        cache: HttpCache | None = default_cache,
+        transcoder: Transcoder | None = None,
+    ) -> None:
+        self._limit = ConcurrencyLimit(
+            initial=min(4, concurrency) if adaptive else concurrency,
+            max_limit=concurrency,
+            adaptive=adaptive,
+        )
+        self._max_pending_bytes = max_pending_bytes
+        self._expected_size = expected_size
+        self._downloader = ImageDownloader(chunk_size, store, cache, transcoder)
+        self._budget = threading.Condition()
+        self._pending = 0
+        self._pending_bytes = 0
+        self._ready = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopped: asyncio.Event | None = None
+        self._thread = threading.Thread(
+            target=self._serve, name="image-downloads", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+        metrics.queue_depth.set_function(lambda: self._pending, queue="downloads")
+        metrics.download_backlog_bytes.set_function(lambda: self._pending_bytes)
+        metrics.download_concurrency.set_function(lambda: self._limit.limit)
+        metrics.download_throughput.set_function(lambda: self._limit.throughput)
+
+    @property
+    def limit(self) -> ConcurrencyLimit:
+        return self._limit
+
+    def _serve(self) -> None:
+        http_client.run(self._run())
+        http_client.log_connection_stats()
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._ready.set()
+        await self._stopped.wait()
+
+    async def _download(self, url: str, cookies: str) -> Blob:
+        async with self._limit.slot() as sample:
+            try:
+                blob = await self._downloader.load(url, cookies, sample.throttle)
+            except asyncio.TimeoutError:
+                sample.throttle()
+                raise
+            sample.size = blob.size
+            return blob
+
+    def _has_room(self) -> bool:
+        return (
+            not self._pending_bytes
+            or self._pending_bytes + self._expected_size <= self._max_pending_bytes
+        )
+
+    def submit(self, url: str, cookies: list[dict]) -> Future[Blob]:
+        with self._budget:
+            self._budget.wait_for(self._has_room)
+            reserved = self._expected_size
+            self._pending += 1
+            self._pending_bytes += reserved
+        future = asyncio.run_coroutine_threadsafe(
+            self._download(url, build_cookies(cookies)), self._loop
+        )
+        future.add_done_callback(partial(self._release, reserved))
+        return future
+
+    def _release(self, reserved: int, future: Future[Blob]) -> None:
+        with self._budget:
+            self._pending -= 1
+            self._pending_bytes -= reserved
+            if not future.cancelled() and future.exception() is None:
+                size = future.result().size
+                self._expected_size = int(0.8 * self._expected_size + 0.2 * size)
+            self._budget.notify_all()
+
+    def close(self) -> None:
+        with self._budget:
+            self._budget.wait_for(lambda: not self._pending)
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+        metrics.queue_depth.remove_function(queue="downloads")
+        metrics.download_backlog_bytes.remove_function()
+        metrics.download_concurrency.remove_function()
+        metrics.download_throughput.remove_function()
+        logger.info(
+            "Image downloads finished with a concurrency limit of %s at %.1f MB/s",
+            self._limit.limit,
+            self._limit.throughput / 1024 / 1024,
+        )
@@ -0,0 +1,396 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "behance"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Timed inside other stages, so they are left out of the profile share total.
+NESTED_STAGES = frozenset({"db_query", "db_commit"})
+
+LabelValues = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]) -> None:
+        self.name = f"{PREFIX}_{name}"
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def values(self) -> dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> Iterator[str]:
+        values = self.values()
+        if not values and not self.label_names:
+            values[()] = 0
+        for key, value in sorted(values.items()):
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[LabelValues, float] = {}
+        self._functions: dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def remove_function(self, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if function := self._functions.pop(key, None):
+                self._values[key] = function()
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        with self._lock:
+            function = self._functions.get(key)
+            if function is None:
+                return self._values.get(key, 0)
+        return function()
+
+    def values(self) -> dict[LabelValues, float]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        values.update((key, function()) for key, function in functions.items())
+        return values
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values().items()):
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._functions.clear()
+
+
+class _HistogramValue:
+    def __init__(self, buckets: int) -> None:
+        self.counts = [0] * buckets
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = _HistogramValue(len(self.buckets))
+            entry = self._values[key]
+            entry.counts[bisect.bisect_left(self.buckets, value)] += 1
+            entry.count += 1
+            entry.sum += value
+            entry.max = max(entry.max, value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, q: float, **labels: str) -> float:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            if not entry or not entry.count:
+                return 0.0
+            counts, maximum = list(entry.counts), entry.max
+            rank = q * entry.count
+        seen, lower = 0, 0.0
+        for upper, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                upper = min(upper, maximum)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return maximum
+
+    def summaries(self) -> dict[LabelValues, tuple[int, float, float]]:
+        with self._lock:
+            return {
+                key: (entry.count, entry.sum, entry.max)
+                for key, entry in self._values.items()
+            }
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            entries = sorted(
+                (key, list(entry.counts), entry.count, entry.sum)
+                for key, entry in self._values.items()
+            )
+        for key, counts, count, total in entries:
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, le=_format_value(upper))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._register(Counter(name, help_text, tuple(labels)))
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._register(Gauge(name, help_text, tuple(labels)))
+
+    def histogram(
+        self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, tuple(labels), buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+    def reset(self) -> None:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "stage_seconds", "Time spent in each pipeline stage", labels=("stage",)
+)
+downloaded_bytes = registry.counter(
+    "downloaded_bytes_total", "Bytes received over HTTP", labels=("kind",)
+)
+http_responses = registry.counter(
+    "http_responses_total", "HTTP responses by status code", labels=("status",)
+)
+http_errors = registry.counter(
+    "http_errors_total", "HTTP requests that failed without a response"
+)
+projects = registry.counter(
+    "projects_total", "Projects handled by the pipeline", labels=("result",)
+)
+images = registry.counter(
+    "images_total", "Image downloads by outcome", labels=("result",)
+)
+exported_bytes = registry.counter(
+    "exported_bytes_total", "Bytes of images linked into export folders"
+)
+queue_depth = registry.gauge(
+    "queue_depth", "Items waiting in a work queue", labels=("queue",)
+)
+download_backlog_bytes = registry.gauge(
+    "download_backlog_bytes", "Expected bytes of image downloads not finished yet"
+)
+download_concurrency = registry.gauge(
+    "download_concurrency_limit", "Image downloads allowed in flight at once"
+)
+download_throughput = registry.gauge(
+    "download_throughput_bytes", "Image bytes per second in the last sampling window"
+)
+
+
+def time_stage(stage: str):
+    return stage_seconds.time(stage=stage)
+
+
+def write_file(path: str | Path) -> None:
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(registry.render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+
+def serve(port: int, host: str = "") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    logger.info("Serving metrics on port %s", server.server_address[1])
+    return server
+
+
+def format_profile() -> str:
+    summaries = sorted(
+        stage_seconds.summaries().items(),
+        key=lambda item: (item[0][0] in NESTED_STAGES, -item[1][1]),
+    )
+    total_time = (
+        sum(t for (stage,), (_, t, _) in summaries if stage not in NESTED_STAGES)
+        or 1.0
+    )
+    lines = [
+        f"{'stage':<16}{'count':>8}{'total s':>10}{'share':>8}"
+        f"{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    ]
+    for (stage,), (count, total, maximum) in summaries:
+        name = f"{stage} *" if stage in NESTED_STAGES else stage
+        lines.append(
+            f"{name:<16}{count:>8}{total:>10.2f}{total / total_time:>8.1%}"
+            f"{total / count * 1000:>10.1f}"
+            f"{stage_seconds.quantile(0.5, stage=stage) * 1000:>10.1f}"
+            f"{stage_seconds.quantile(0.99, stage=stage) * 1000:>10.1f}"
+            f"{maximum * 1000:>10.1f}"
+        )
+    if any(stage in NESTED_STAGES for (stage,), _ in summaries):
+        lines.append("* nested in the stages above, not counted in the share total")
+    for (kind,), value in sorted(downloaded_bytes.values().items()):
+        lines.append(f"downloaded {kind}: {value / 1024 / 1024:.2f} MB")
+    return "\n".join(lines)
@@ -1,26 +1,47 @@
+import asyncio
 import logging
-import time
+import os
+import threading
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
-from behance_parser import fetcher, storage
+from behance_parser import fetcher, http_cache, http_client, storage
+from behance_parser.rate_limit import RateLimiter
 
-service = Service(executable_path=ChromeDriverManager().install())
 logger = logging.getLogger(__name__)
 
 _driver = None
+_service: Service | None = None
+_service_lock = threading.Lock()
+
+
+def _get_service() -> Service:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = Service(executable_path=ChromeDriverManager().install())
+        return _service
+
+
+def create_driver(headless: bool = False) -> webdriver.Chrome:
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(service=_get_service(), options=options)
 
 
 def get_driver():
     global _driver
     if not _driver:
-        _driver = webdriver.Chrome(service=service)
+        _driver = create_driver()
     return _driver
 
 
-behance_url = "https://www.behance.net/"
+behance_url = os.environ.get("BEHANCE_URL", "https://www.behance.net/")
 cookies: list[dict] = []
 
 
@@ -30,43 +51,97 @@ def get_page_cookies(url: str) -> list[dict[str, str]]:
     return driver.get_cookies()
 
 
-def _do(
-    url: str,
-    offset: int,
-    cookies: list[dict[str, str]],
+async def _parse_agency(
     agency_name: str,
-) -> tuple[bool, int]:
-    projects, has_more = fetcher.get_data(
-        url=url,
-        cookies=cookies,
-        offset=offset,
-    )
-    logging.info("Found %s projects", len(projects))
-    storage.store_projects(projects, agency_name=agency_name)
-    time.sleep(2)
-    return has_more, offset + 12
-
-
-def parse_agency(agency_name: str) -> None:
+    cookies: list[dict[str, str]],
+    limiter: RateLimiter,
+    stop_at: int | None = None,
+) -> None:
     url = f"{behance_url}{agency_name}"
-    cookies = get_page_cookies(url)
-
-    has_more, offset = _do(
-        url=url,
-        cookies=cookies,
-        offset=0,
-        agency_name=agency_name,
-    )
+    offset = 0
+    has_more = True
+    newest_behance_id = None
     while has_more:
-        has_more, offset = _do(
+        projects, has_more = await fetcher.fetch_projects(
             url=url,
             cookies=cookies,
             offset=offset,
-            agency_name=agency_name,
+            limiter=limiter,
         )
+        logger.info("Found %s projects for %s", len(projects), agency_name)
+        if projects:
+            newest_behance_id = max(
+                newest_behance_id or 0, *[project.id for project in projects]
+            )
+        new_projects = storage.store_projects(projects, agency_name=agency_name)
+        # An earlier crawl that failed partway leaves known projects above
+        # its high-water mark, so only stop once the page reaches that mark.
+        if (
+            stop_at is not None
+            and projects
+            and not new_projects
+            and min(project.id for project in projects) <= stop_at
+        ):
+            logger.info(
+                "Reached known projects for %s at offset %s", agency_name, offset
+            )
+            break
+        offset += 12
+    storage.finish_agency_crawl(agency_name, newest_behance_id)
+
+
+async def _collect(
+    agencies: list[tuple[str, int | None]],
+    cookies: list[dict[str, str]],
+    limiter: RateLimiter,
+    concurrency: int,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(agency_name: str, stop_at: int | None) -> None:
+        async with semaphore:
+            try:
+                await _parse_agency(agency_name, cookies, limiter, stop_at=stop_at)
+            except Exception:
+                logger.exception("Error while collecting agency %s", agency_name)
+
+    await asyncio.gather(*[_run(name, stop_at) for name, stop_at in agencies])
 
 
-def collect_tasks_for_parsing():
-    agencies = storage.get_all_agencies()
-    for agency in agencies:
-        parse_agency(agency.name)
+def _stop_at(agency: storage.Agency) -> int | None:
+    if agency.last_crawled_at is None:
+        return None
+    return agency.last_seen_behance_id
+
+
+def parse_agency(
+    agency_name: str,
+    rate: float = 0.5,
+    cookies: list[dict[str, str]] | None = None,
+    full: bool = True,
+) -> None:
+    if cookies is None:
+        cookies = get_page_cookies(f"{behance_url}{agency_name}")
+    limiter = RateLimiter(rate=rate, per_host_rate=rate)
+    stop_at = None if full else _stop_at(storage.get_agency(agency_name))
+    http_client.run(_parse_agency(agency_name, cookies, limiter, stop_at=stop_at))
+
+
+def collect_tasks_for_parsing(
+    concurrency: int = 8,
+    rate: float = 5.0,
+    per_host_rate: float = 2.0,
+    cookies: list[dict[str, str]] | None = None,
+    full: bool = False,
+) -> None:
+    agencies = [
+        (agency.name, None if full else _stop_at(agency))
+        for agency in storage.get_all_agencies()
+    ]
+    if cookies is None:
+        cookies = get_page_cookies(behance_url)
+    limiter = RateLimiter(rate=rate, per_host_rate=per_host_rate)
+    http_client.run(_collect(agencies, cookies, limiter, concurrency))
+    http_client.log_connection_stats()
+    if http_cache.default_cache:
+        http_cache.default_cache.log_stats()
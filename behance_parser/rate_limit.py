@@ -0,0 +1,147 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self._rate = rate
+        self._capacity = capacity or max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, per_host_rate: float) -> None:
+        self._global = TokenBucket(rate)
+        self._per_host_rate = per_host_rate
+        self._hosts: dict[str, TokenBucket] = {}
+
+    def _host_bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = TokenBucket(self._per_host_rate)
+        return self._hosts[host]
+
+    async def acquire(self, url: str) -> None:
+        await self._host_bucket(url).acquire()
+        await self._global.acquire()
+
+
+@dataclass
+class Sample:
+    size: int = 0
+    throttled: bool = False
+
+    def throttle(self) -> None:
+        self.throttled = True
+
+
+class ConcurrencyLimit:
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        adaptive: bool = True,
+        window: float = 0.5,
+        gain: float = 0.05,
+        latency_tolerance: float = 1.5,
+        backoff: float = 0.7,
+    ) -> None:
+        self._limit = min(max(initial, min_limit), max_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._adaptive = adaptive
+        self._window = window
+        self._gain = gain
+        self._latency_tolerance = latency_tolerance
+        self._backoff = backoff
+        self._in_flight = 0
+        self._condition: asyncio.Condition | None = None
+        self._window_started = time.monotonic()
+        self._window_bytes = 0
+        self._window_latency = 0.0
+        self._window_samples = 0
+        self._window_throttled = False
+        self._window_saturated = False
+        self._base_latency: float | None = None
+        self._last_throughput = 0.0
+        self.throughput = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Sample]:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+            if self._in_flight >= self._limit:
+                self._window_saturated = True
+        sample = Sample()
+        started = time.monotonic()
+        try:
+            yield sample
+        finally:
+            self._record(sample, time.monotonic() - started)
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def _record(self, sample: Sample, latency: float) -> None:
+        self._window_bytes += sample.size
+        self._window_latency += latency
+        self._window_samples += 1
+        if sample.throttled and self._adaptive and not self._window_throttled:
+            self._window_throttled = True
+            self._limit = max(self._min_limit, int(self._limit * self._backoff))
+        elapsed = time.monotonic() - self._window_started
+        if elapsed >= self._window and self._window_samples >= self._limit:
+            self._close_window(elapsed)
+
+    def _close_window(self, elapsed: float) -> None:
+        self.throughput = self._window_bytes / elapsed
+        latency = self._window_latency / self._window_samples
+        if self._base_latency is None or latency < self._base_latency:
+            self._base_latency = latency
+        if self._adaptive and self._window_saturated and not self._window_throttled:
+            if self.throughput > self._last_throughput * (1 + self._gain):
+                self._limit += 1
+            elif latency > self._base_latency * self._latency_tolerance:
+                self._limit -= 1
+            else:
+                self._limit += 1
+            self._limit = min(max(self._limit, self._min_limit), self._max_limit)
+        if self._window_saturated:
+            self._last_throughput = self.throughput
+        self._window_started = time.monotonic()
+        self._window_bytes = 0
+        self._window_latency = 0.0
+        self._window_samples = 0
+        self._window_throttled = False
+        self._window_saturated = False
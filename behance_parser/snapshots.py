@@ -0,0 +1,21 @@
+import zlib
+from datetime import timedelta
+
+from behance_parser import html_engines
+
+COMPRESSION_LEVEL = 6
+DEFAULT_TTL = timedelta(days=7)
+
+
+def compress(html: str) -> bytes:
+    return zlib.compress(html.encode(), COMPRESSION_LEVEL)
+
+
+def decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode()
+
+
+def extract(
+    engine_name: str, data: bytes, max_image_width: int | None = None
+) -> html_engines.ProjectContent | None:
+    return html_engines.extract(engine_name, decompress(data), max_image_width)
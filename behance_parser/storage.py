@@ -1,14 +1,103 @@
 import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Sequence
 
 import sqlalchemy as sa
-from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
-
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import (
+    Session,
+    declarative_base,
+    joinedload,
+    scoped_session,
+    sessionmaker,
+)
+
+from behance_parser import blob_store, metrics
 from behance_parser.fetcher import Project
 
 logger = logging.getLogger(__name__)
 
-engine = sa.create_engine("sqlite:///data.db", echo=False)
-db_session = scoped_session(sessionmaker(autocommit=False, bind=engine))
+DEFAULT_DATABASE_URL = "sqlite:///data.db"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 30 * 1000,
+    "temp_store": "MEMORY",
+}
+
+
+def get_database_url() -> str:
+    if url := os.environ.get("BEHANCE_DB_URL"):
+        return url
+    if path := os.environ.get("BEHANCE_DB_PATH"):
+        return f"sqlite:///{path}"
+    return DEFAULT_DATABASE_URL
+
+
+def _create_engine(url: str, sqlite_pragmas: dict[str, str | int]) -> sa.engine.Engine:
+    engine = sa.create_engine(url, echo=False)
+    if engine.dialect.name == "sqlite" and sqlite_pragmas:
+
+        @sa.event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    @sa.event.listens_for(engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @sa.event.listens_for(engine, "after_cursor_execute")
+    def _stop_query_timer(conn, cursor, statement, parameters, context, many):
+        started = conn.info["query_started"].pop()
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage="db_query")
+
+    return engine
+
+
+engine = _create_engine(get_database_url(), SQLITE_PRAGMAS)
+_session_factory = sessionmaker(autocommit=False, bind=engine)
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _ensure_schema() -> None:
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            _init_schema()
+            _schema_ready = True
+
+
+def _create_session() -> Session:
+    # The schema is created on first use, so a database chosen with
+    # configure() is the only one touched.
+    _ensure_schema()
+    return _session_factory()
+
+
+db_session = scoped_session(_create_session)
+
+
+@sa.event.listens_for(_session_factory, "before_commit")
+def _start_commit_timer(session: Session) -> None:
+    session.info["commit_started"] = time.perf_counter()
+
+
+@sa.event.listens_for(_session_factory, "after_commit")
+def _stop_commit_timer(session: Session) -> None:
+    if started := session.info.pop("commit_started", None):
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage="db_commit")
+
+
 Base = declarative_base()
 Base.query = db_session.query_property()
 
@@ -18,6 +107,8 @@ class Agency(Base):
 
     id: int = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     name: str = sa.Column(sa.Text, unique=True)
+    last_seen_behance_id: int = sa.Column(sa.Integer, default=None)
+    last_crawled_at: datetime = sa.Column(sa.DateTime, default=None)
 
 
 class Task(Base):
@@ -33,6 +124,8 @@ class Task(Base):
     url: str = sa.Column(sa.Text, nullable=False)
     is_parsed: bool = sa.Column(sa.Boolean, default=False)
     error: bool = sa.Column(sa.Boolean, default=None)
+    lease_owner: str = sa.Column(sa.Text, default=None)
+    lease_expires_at: datetime = sa.Column(sa.DateTime, default=None)
 
 
 class Text(Base):
@@ -47,17 +140,38 @@ class Text(Base):
     __table_args__ = (sa.Index("text_task_id__uuid__uidx", task_id, uuid, unique=True),)
 
 
+IMAGE_PENDING = "pending"
+IMAGE_DONE = "done"
+IMAGE_FAILED = "failed"
+MAX_IMAGE_ATTEMPTS = 3
+IMAGE_RETRY_DELAY = timedelta(minutes=1)
+
+
 class Image(Base):
     __tablename__ = "image"
 
     id: int = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     task_id: int = sa.Column(sa.Integer, sa.ForeignKey("task.id"), nullable=False)
     task: "Task" = sa.orm.relationship("Task", uselist=False, foreign_keys=[task_id])
-    image: bytes = sa.Column(sa.BLOB, nullable=False)
     uuid: str = sa.Column(sa.Text, nullable=False)
+    url: str = sa.Column(sa.Text, default=None)
+    status: str = sa.Column(
+        sa.Text, nullable=False, default=IMAGE_DONE, server_default=IMAGE_DONE
+    )
+    attempts: int = sa.Column(sa.Integer, nullable=False, default=0, server_default="0")
+    error: str = sa.Column(sa.Text, default=None)
+    retry_after: datetime = sa.Column(sa.DateTime, default=None)
+    hash: str = sa.Column(sa.Text, default=None)
+    size: int = sa.Column(sa.Integer, default=None)
+    mime_type: str = sa.Column(sa.Text, default=None)
+    width: int = sa.Column(sa.Integer, default=None)
+    height: int = sa.Column(sa.Integer, default=None)
+    phash: str = sa.Column(sa.Text, default=None)
 
     __table_args__ = (
         sa.Index("image_task_id__uuid__uidx", task_id, uuid, unique=True),
+        sa.Index("image_hash_idx", hash),
+        sa.Index("image_uuid_idx", uuid),
     )
 
 
@@ -74,30 +188,185 @@ class Video(Base):
     )
 
 
-Base.metadata.create_all(engine, checkfirst=True)
+class Snapshot(Base):
+    __tablename__ = "snapshot"
+
+    task_id: int = sa.Column(sa.Integer, sa.ForeignKey("task.id"), primary_key=True)
+    html: bytes = sa.Column(sa.LargeBinary, nullable=False)
+    fetched_at: datetime = sa.Column(sa.DateTime, nullable=False)
+
+
+def _has_legacy_image_table() -> bool:
+    columns = {i["name"] for i in sa.inspect(engine).get_columns("image")}
+    return "image" in columns
+
+
+def migrate_legacy_images(batch_size: int = 100) -> int:
+    _ensure_schema()
+    if not _has_legacy_image_table():
+        return 0
+    db_session.remove()
+    migrated = 0
+    with engine.begin() as conn:
+        conn.execute(sa.text("ALTER TABLE image RENAME TO image_legacy"))
+        conn.execute(sa.text("DROP INDEX IF EXISTS image_task_id__uuid__uidx"))
+        Image.__table__.create(conn)
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.text(
+                    "SELECT id, task_id, uuid, image FROM image_legacy "
+                    "WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ),
+                dict(last_id=last_id, limit=batch_size),
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                blob = blob_store.default_store.put(row.image)
+                conn.execute(
+                    sa.insert(Image).values(
+                        id=row.id,
+                        task_id=row.task_id,
+                        uuid=row.uuid,
+                        hash=blob.hash,
+                        size=blob.size,
+                        mime_type=blob.mime_type,
+                    )
+                )
+                last_id = row.id
+            migrated += len(rows)
+            logger.info("Migrated %s images to blob store", migrated)
+        conn.execute(sa.text("DROP TABLE image_legacy"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sa.text("VACUUM"))
+    return migrated
+
+
+def _has_blob_only_image_table() -> bool:
+    columns = {i["name"] for i in sa.inspect(engine).get_columns("image")}
+    return "hash" in columns and "status" not in columns
+
+
+def _upgrade_image_table() -> None:
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            for column in ("hash", "size", "mime_type"):
+                conn.execute(
+                    sa.text(f"ALTER TABLE image ALTER COLUMN {column} DROP NOT NULL")
+                )
+            conn.execute(
+                sa.text(
+                    "ALTER TABLE image "
+                    f"ADD COLUMN status TEXT NOT NULL DEFAULT '{IMAGE_DONE}', "
+                    "ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+                )
+            )
+            return
+        conn.execute(sa.text("ALTER TABLE image RENAME TO image_old"))
+        conn.execute(sa.text("DROP INDEX IF EXISTS image_task_id__uuid__uidx"))
+        conn.execute(sa.text("DROP INDEX IF EXISTS image_hash_idx"))
+        Image.__table__.create(conn)
+        conn.execute(
+            sa.text(
+                "INSERT INTO image (id, task_id, uuid, hash, size, mime_type) "
+                "SELECT id, task_id, uuid, hash, size, mime_type FROM image_old"
+            )
+        )
+        conn.execute(sa.text("DROP TABLE image_old"))
+    logger.info("Upgraded image table to track download status")
+
+
+def _add_missing_columns(skip: set[str]) -> None:
+    inspector = sa.inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name in skip:
+                continue
+            existing = {i["name"] for i in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    sa.text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+def _create_missing_indexes() -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _init_schema() -> None:
+    Base.metadata.create_all(engine, checkfirst=True)
+    # A BLOB image table must keep its shape until migrate-images moves it over,
+    # adding columns to it first would hide it from _has_legacy_image_table.
+    is_legacy = _has_legacy_image_table()
+    if not is_legacy and _has_blob_only_image_table():
+        _upgrade_image_table()
+    _add_missing_columns(skip={"image"} if is_legacy else set())
+    if is_legacy:
+        logger.warning(
+            "Image table still stores BLOBs, run `behance-parser migrate-images` first"
+        )
+    else:
+        _create_missing_indexes()
+
+
+def configure(
+    database: str | None = None,
+    sqlite_pragmas: dict[str, str | int] | None = None,
+) -> None:
+    global engine, _schema_ready
+    if database:
+        url = database if "://" in database else f"sqlite:///{database}"
+        os.environ["BEHANCE_DB_URL"] = url
+    db_session.remove()
+    engine.dispose()
+    engine = _create_engine(
+        get_database_url(),
+        SQLITE_PRAGMAS if sqlite_pragmas is None else sqlite_pragmas,
+    )
+    _session_factory.configure(bind=engine)
+    _schema_ready = False
+    _ensure_schema()
+
+
+def _insert(model: type[Base]):
+    if db_session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
 
-def _save_project(project: Project, agency_id: int) -> None:
-    query = sa.select(Task).where(Task.behance_id == project.id)
-    task = db_session.execute(query).scalar_one_or_none()
-    if task:
-        return
-    db_session.add(
-        Task(
+def _insert_ignoring_conflicts(model: type[Base], *index_elements: sa.Column):
+    return _insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def store_projects(projects: list[Project], agency_name: str) -> int:
+    if not projects:
+        return 0
+    agency = _get_agency(agency_name=agency_name)
+    rows = [
+        dict(
             behance_id=project.id,
             name=project.name,
             url=project.url,
-            agency_id=agency_id,
+            agency_id=agency.id,
         )
+        for project in projects
+    ]
+    result = db_session.execute(
+        _insert_ignoring_conflicts(Task, Task.behance_id), rows
     )
     db_session.commit()
-    logger.info("Saved task for behance project: %s", project.id)
-
-
-def store_projects(projects: list[Project], agency_name: str) -> None:
-    agency = _get_agency(agency_name=agency_name)
-    for project in projects:
-        _save_project(project, agency_id=agency.id)
+    logger.info("Saved %s new tasks for agency %s", result.rowcount, agency_name)
+    return result.rowcount
 
 
 def _get_agency(agency_name: str) -> Agency | None:
@@ -112,6 +381,19 @@ def _get_agency(agency_name: str) -> Agency | None:
     return agency
 
 
+def get_agency(agency_name: str) -> Agency:
+    return _get_agency(agency_name=agency_name)
+
+
+def finish_agency_crawl(agency_name: str, newest_behance_id: int | None) -> None:
+    agency = _get_agency(agency_name=agency_name)
+    if newest_behance_id and newest_behance_id > (agency.last_seen_behance_id or 0):
+        agency.last_seen_behance_id = newest_behance_id
+    agency.last_crawled_at = datetime.utcnow()
+    db_session.add(agency)
+    db_session.commit()
+
+
 def create_agencies(agencies: list[str]) -> None:
     for agency in agencies:
         _get_agency(agency)
@@ -127,19 +409,189 @@ def get_task_by_id(id_: int) -> Task | None:
     return db_session.execute(query).scalar_one_or_none()
 
 
-def store_image(uuid: str, data: bytes, task: Task) -> None:
+def store_image(uuid: str, blob: blob_store.Blob, task: Task) -> None:
     if is_image_exist(uuid, task.id):
         return
     img = Image(
         task=task,
-        image=data,
         uuid=uuid,
+        hash=blob.hash,
+        size=blob.size,
+        mime_type=blob.mime_type,
     )
     db_session.add(img)
     db_session.commit()
     logger.info("Stored image with uuid: %s", uuid)
 
 
+def image_uuid(url: str) -> str:
+    return url.split("/")[-1]
+
+
+def _is_image_pending(max_attempts: int) -> sa.sql.ColumnElement:
+    return sa.and_(Image.status != IMAGE_DONE, Image.attempts < max_attempts)
+
+
+def _is_image_due(max_attempts: int, now: datetime) -> sa.sql.ColumnElement:
+    return sa.and_(
+        _is_image_pending(max_attempts),
+        sa.or_(Image.retry_after.is_(None), Image.retry_after <= now),
+    )
+
+
+def get_pending_images(
+    task_id: int, max_attempts: int = MAX_IMAGE_ATTEMPTS
+) -> list[Image]:
+    query = sa.select(Image).where(
+        sa.and_(
+            Image.task_id == task_id,
+            _is_image_due(max_attempts, datetime.utcnow()),
+        )
+    )
+    return db_session.execute(query).scalars().all()
+
+
+def has_pending_images(task_id: int, max_attempts: int = MAX_IMAGE_ATTEMPTS) -> bool:
+    query = sa.select(Image.id).where(
+        sa.and_(Image.task_id == task_id, _is_image_pending(max_attempts))
+    )
+    return db_session.execute(query.limit(1)).first() is not None
+
+
+def _next_image_retry(task_id: int, max_attempts: int) -> datetime | None:
+    query = sa.select(sa.func.min(Image.retry_after)).where(
+        sa.and_(Image.task_id == task_id, _is_image_pending(max_attempts))
+    )
+    return db_session.execute(query).scalar_one_or_none()
+
+
+def has_exhausted_images(task_id: int, max_attempts: int = MAX_IMAGE_ATTEMPTS) -> bool:
+    query = sa.select(Image.id).where(
+        sa.and_(
+            Image.task_id == task_id,
+            Image.status != IMAGE_DONE,
+            Image.attempts >= max_attempts,
+        )
+    )
+    return db_session.execute(query.limit(1)).first() is not None
+
+
+def reset_failed_images(task_id: int) -> int:
+    query = (
+        sa.update(Image)
+        .where(sa.and_(Image.task_id == task_id, Image.status == IMAGE_FAILED))
+        .values(attempts=0, retry_after=None)
+        .execution_options(synchronize_session=False)
+    )
+    result = db_session.execute(query)
+    db_session.commit()
+    return result.rowcount
+
+
+def _blob_values(blob: blob_store.Blob, phash: str | None) -> dict:
+    return dict(
+        hash=blob.hash,
+        size=blob.size,
+        mime_type=blob.mime_type,
+        width=blob.width,
+        height=blob.height,
+        phash=phash,
+    )
+
+
+def mark_image_done(
+    image_id: int, blob: blob_store.Blob, phash: str | None = None
+) -> None:
+    query = (
+        sa.update(Image)
+        .where(Image.id == image_id)
+        .values(
+            status=IMAGE_DONE,
+            attempts=Image.attempts + 1,
+            error=None,
+            retry_after=None,
+            **_blob_values(blob, phash),
+        )
+    )
+    db_session.execute(query)
+    db_session.commit()
+
+
+def relink_images(
+    image_ids: list[int], blob: blob_store.Blob, phash: str | None
+) -> None:
+    query = (
+        sa.update(Image)
+        .where(Image.id.in_(image_ids))
+        .values(**_blob_values(blob, phash))
+        .execution_options(synchronize_session=False)
+    )
+    db_session.execute(query)
+    db_session.commit()
+
+
+def find_done_image(uuid: str) -> Image | None:
+    query = (
+        sa.select(Image)
+        .where(sa.and_(Image.uuid == uuid, Image.status == IMAGE_DONE))
+        .limit(1)
+    )
+    return db_session.execute(query).scalar_one_or_none()
+
+
+def get_referenced_blobs(digests: list[str]) -> set[str]:
+    query = sa.select(Image.hash).where(Image.hash.in_(digests)).distinct()
+    return set(db_session.execute(query).scalars().all())
+
+
+def get_done_images(after_id: int = 0, limit: int = 1000) -> list[Image]:
+    query = (
+        sa.select(Image)
+        .where(sa.and_(Image.id > after_id, Image.status == IMAGE_DONE))
+        .order_by(Image.id)
+        .limit(limit)
+    )
+    return db_session.execute(query).scalars().all()
+
+
+def mark_image_failed(
+    image_id: int,
+    error: str,
+    count_attempt: bool = True,
+    retry_delay: timedelta = IMAGE_RETRY_DELAY,
+) -> None:
+    query = (
+        sa.update(Image)
+        .where(Image.id == image_id)
+        .values(
+            status=IMAGE_FAILED,
+            attempts=Image.attempts + 1 if count_attempt else Image.attempts,
+            error=error,
+            retry_after=datetime.utcnow() + retry_delay,
+        )
+    )
+    db_session.execute(query)
+    db_session.commit()
+
+
+def finalize_task(task: Task, max_attempts: int = MAX_IMAGE_ATTEMPTS) -> bool:
+    has_pending = has_pending_images(task.id, max_attempts)
+    task.lease_owner = None
+    # Failed images wait out their retry delay, so the task is not claimable
+    # again before the earliest of them is due.
+    task.lease_expires_at = (
+        _next_image_retry(task.id, max_attempts) if has_pending else None
+    )
+    if not has_pending and has_exhausted_images(task.id, max_attempts):
+        task.is_parsed = False
+        task.error = True
+    else:
+        task.is_parsed = not has_pending
+    db_session.add(task)
+    db_session.commit()
+    return task.is_parsed
+
+
 def is_image_exist(uuid: str, task_id: int) -> bool:
     query = sa.select(Image).where(
         sa.and_(
@@ -191,37 +643,181 @@ def store_video(uuid: str, link: str, task: Task) -> None:
     logger.info("Stored video link with uuid: %s", uuid)
 
 
+def store_project_content(
+    task: Task,
+    texts: dict[str, str],
+    videos: dict[str, str],
+    images: dict[str, blob_store.Blob],
+    image_urls: Sequence[str] = (),
+    mark_parsed: bool = False,
+) -> None:
+    if texts:
+        db_session.execute(
+            _insert_ignoring_conflicts(Text, Text.task_id, Text.uuid),
+            [dict(task_id=task.id, uuid=k, text=v) for k, v in texts.items()],
+        )
+    if videos:
+        db_session.execute(
+            _insert_ignoring_conflicts(Video, Video.task_id, Video.uuid),
+            [dict(task_id=task.id, uuid=k, link=v) for k, v in videos.items()],
+        )
+    if images:
+        db_session.execute(
+            _insert_ignoring_conflicts(Image, Image.task_id, Image.uuid),
+            [
+                dict(
+                    task_id=task.id,
+                    uuid=k,
+                    hash=v.hash,
+                    size=v.size,
+                    mime_type=v.mime_type,
+                    width=v.width,
+                    height=v.height,
+                )
+                for k, v in images.items()
+            ],
+        )
+    if image_urls:
+        db_session.execute(
+            _insert_ignoring_conflicts(Image, Image.task_id, Image.uuid),
+            [
+                dict(
+                    task_id=task.id,
+                    uuid=image_uuid(url),
+                    url=url,
+                    status=IMAGE_PENDING,
+                )
+                for url in image_urls
+            ],
+        )
+    if mark_parsed:
+        task.is_parsed = True
+        task.lease_owner = None
+        task.lease_expires_at = None
+        db_session.add(task)
+    db_session.commit()
+    logger.info(
+        "Stored %s texts, %s videos and %s images for task %s",
+        len(texts),
+        len(videos),
+        len(images) + len(image_urls),
+        task.id,
+    )
+
+
 def set_task_parsing_status(task: Task, is_parsed: bool) -> None:
     task.is_parsed = is_parsed
+    task.lease_owner = None
+    task.lease_expires_at = None
     db_session.add(task)
     db_session.commit()
 
 
 def set_task_error_status(task: Task, is_error: bool) -> None:
     task.error = is_error
+    task.lease_owner = None
+    task.lease_expires_at = None
     db_session.add(task)
     db_session.commit()
 
 
+def _parsed_agency_tasks(agency_id: int) -> sa.sql.ColumnElement:
+    return sa.and_(Task.agency_id == agency_id, Task.is_parsed.is_(True))
+
+
 def get_tasks_by_agency_id(agency_id: int) -> list[Task]:
+    query = (
+        sa.select(Task)
+        .options(joinedload(Task.agency))
+        .where(_parsed_agency_tasks(agency_id))
+    )
+    return db_session.execute(query).scalars().all()
+
+
+def _group_by_task(rows: list[sa.engine.Row]) -> dict[int, list[sa.engine.Row]]:
+    grouped: dict[int, list[sa.engine.Row]] = defaultdict(list)
+    for row in rows:
+        grouped[row.task_id].append(row)
+    return grouped
+
+
+def get_agency_texts(agency_id: int) -> dict[int, list[str]]:
+    query = (
+        sa.select(Text.task_id, Text.text)
+        .join(Task, Task.id == Text.task_id)
+        .where(_parsed_agency_tasks(agency_id))
+        .order_by(Text.id)
+    )
+    grouped = _group_by_task(db_session.execute(query).all())
+    return {k: [i.text for i in v] for k, v in grouped.items()}
+
+
+def get_agency_videos(agency_id: int) -> dict[int, list[str]]:
+    query = (
+        sa.select(Video.task_id, Video.link)
+        .join(Task, Task.id == Video.task_id)
+        .where(_parsed_agency_tasks(agency_id))
+        .order_by(Video.id)
+    )
+    grouped = _group_by_task(db_session.execute(query).all())
+    return {k: [i.link for i in v] for k, v in grouped.items()}
+
+
+def get_agency_image_files(agency_id: int) -> dict[int, list[sa.engine.Row]]:
+    query = (
+        sa.select(Image.task_id, Image.uuid, Image.hash, Image.size, Image.mime_type)
+        .join(Task, Task.id == Image.task_id)
+        .where(sa.and_(_parsed_agency_tasks(agency_id), Image.status == IMAGE_DONE))
+        .order_by(Image.id)
+    )
+    return _group_by_task(db_session.execute(query).all())
+
+
+def _is_claimable(now: datetime) -> sa.sql.ColumnElement:
+    return sa.and_(
+        Task.is_parsed.is_(False),
+        Task.error.isnot(True),
+        sa.or_(Task.lease_expires_at.is_(None), Task.lease_expires_at < now),
+    )
+
+
+def claim_tasks_for_parsing(
+    owner: str,
+    limit: int = 10,
+    lease_seconds: int = 900,
+) -> list[Task]:
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    claimable = sa.select(Task.id).where(_is_claimable(now)).limit(limit)
+    query = (
+        sa.update(Task)
+        .where(sa.and_(Task.id.in_(claimable), _is_claimable(now)))
+        .values(lease_owner=owner, lease_expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    db_session.execute(query)
+    db_session.commit()
     query = sa.select(Task).where(
-        sa.and_(Task.agency_id == agency_id, Task.is_parsed.is_(True))
+        sa.and_(Task.lease_owner == owner, Task.lease_expires_at == expires_at)
     )
     return db_session.execute(query).scalars().all()
 
 
-def get_next_tasks_for_parsing(limit: int = 10) -> list[Task]:
+def requeue_expired_leases() -> int:
     query = (
-        sa.select(Task)
+        sa.update(Task)
         .where(
             sa.and_(
                 Task.is_parsed.is_(False),
-                Task.error.isnot(True),
+                Task.lease_expires_at < datetime.utcnow(),
             )
         )
-        .limit(limit)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
     )
-    return db_session.execute(query).scalars().all()
+    result = db_session.execute(query)
+    db_session.commit()
+    return result.rowcount
 
 
 def get_task_images(task_id: int) -> list[Image]:
@@ -237,3 +833,52 @@ def get_task_texts(task_id: int) -> list[Text]:
 def get_task_videos(task_id: int) -> list[Video]:
     query = sa.select(Video).where(Video.task_id == task_id)
     return db_session.execute(query).scalars().all()
+
+
+def store_snapshot(task_id: int, html: bytes, fetched_at: datetime) -> None:
+    query = (
+        _insert(Snapshot)
+        .values(task_id=task_id, html=html, fetched_at=fetched_at)
+        .on_conflict_do_update(
+            index_elements=[Snapshot.task_id],
+            set_=dict(html=html, fetched_at=fetched_at),
+        )
+    )
+    db_session.execute(query)
+    db_session.commit()
+
+
+def get_snapshot(task_id: int, max_age: timedelta) -> Snapshot | None:
+    query = sa.select(Snapshot).where(
+        sa.and_(
+            Snapshot.task_id == task_id,
+            Snapshot.fetched_at >= datetime.utcnow() - max_age,
+        )
+    )
+    return db_session.execute(query).scalar_one_or_none()
+
+
+def get_snapshots(task_ids: list[int]) -> list[Snapshot]:
+    query = sa.select(Snapshot).where(Snapshot.task_id.in_(task_ids))
+    return db_session.execute(query).scalars().all()
+
+
+def get_snapshot_task_ids(max_age: timedelta, errors_only: bool = True) -> list[int]:
+    query = (
+        sa.select(Snapshot.task_id)
+        .join(Task, Task.id == Snapshot.task_id)
+        .where(Snapshot.fetched_at >= datetime.utcnow() - max_age)
+        .order_by(Snapshot.task_id)
+    )
+    if errors_only:
+        query = query.where(Task.error.is_(True))
+    return db_session.execute(query).scalars().all()
+
+
+def delete_expired_snapshots(max_age: timedelta) -> int:
+    query = sa.delete(Snapshot).where(
+        Snapshot.fetched_at < datetime.utcnow() - max_age
+    )
+    result = db_session.execute(query)
+    db_session.commit()
+    return result.rowcount
@@ -0,0 +1,77 @@
+import io
+import logging
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from behance_parser.blob_store import Blob, BlobStore
+
+try:
+    from PIL import Image as PillowImage
+    from PIL import features
+except ImportError:
+    PillowImage = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": "WEBP", "avif": "AVIF"}
+
+
+@dataclass(frozen=True)
+class TranscodeOptions:
+    format: str = "webp"
+    quality: int = 80
+    max_width: int | None = None
+
+
+def _encode(data: bytes, options: TranscodeOptions) -> tuple[bytes | None, int, int]:
+    with PillowImage.open(io.BytesIO(data)) as image:
+        if getattr(image, "is_animated", False):
+            return None, image.width, image.height
+        image.load()
+        resized = bool(options.max_width and image.width > options.max_width)
+        if resized:
+            image.thumbnail((options.max_width, image.height))
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=FORMATS[options.format], quality=options.quality)
+    encoded = buffer.getvalue()
+    if not resized and len(encoded) >= len(data):
+        encoded = None
+    return encoded, image.width, image.height
+
+
+def transcode(data: bytes, options: TranscodeOptions, store_root: str) -> Blob:
+    store = BlobStore(store_root)
+    try:
+        encoded, width, height = _encode(data, options)
+    except (OSError, ValueError):
+        logger.warning("Can't transcode image, storing it as downloaded")
+        return store.put(data)
+    return replace(store.put(encoded or data), width=width, height=height)
+
+
+class Transcoder:
+    def __init__(
+        self, options: TranscodeOptions, executor: Executor, store: BlobStore
+    ) -> None:
+        self._options = options
+        self._executor = executor
+        self._store_root = str(Path(store.root).resolve())
+
+    def submit(self, data: bytes) -> Future:
+        return self._executor.submit(transcode, data, self._options, self._store_root)
+
+
+def is_available(options: TranscodeOptions) -> bool:
+    if PillowImage is None:
+        logger.warning("Pillow is not installed, images are stored as downloaded")
+        return False
+    if not features.check(options.format):
+        logger.warning(
+            "Pillow can't encode %s, images are stored as downloaded", options.format
+        )
+        return False
+    return True
@@ -0,0 +1,81 @@
+import argparse
+import tempfile
+import time
+
+from benchmarks.mock_behance import MockBehance, MockConfig
+from behance_parser import http_client, metrics
+from behance_parser.blob_store import BlobStore
+from behance_parser.exceptions import RequestException
+from behance_parser.image_loader import DownloadService
+
+
+def run(
+    server: MockBehance, images: int, concurrency: int, adaptive: bool
+) -> tuple[float, int, int, int]:
+    metrics.registry.reset()
+    size, failed = 0, 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = DownloadService(
+            concurrency=concurrency,
+            adaptive=adaptive,
+            store=BlobStore(tmp_dir),
+            cache=None,
+        )
+        try:
+            started = time.perf_counter()
+            futures = [
+                service.submit(f"{server.base_url}cdn/{started}/{i}.jpg", [])
+                for i in range(images)
+            ]
+            for future in futures:
+                try:
+                    size += future.result().size
+                except RequestException:
+                    failed += 1
+            elapsed = time.perf_counter() - started
+            limit = service.limit.limit
+        finally:
+            service.close()
+    throttled = int(metrics.http_responses.value(status="429"))
+    return size / elapsed / 1024 / 1024, limit, throttled, failed
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--images", type=int, default=400)
+    arg_parser.add_argument("--image-size", type=int, default=256 * 1024)
+    arg_parser.add_argument("--image-latency", type=float, default=50.0)
+    arg_parser.add_argument("--bandwidth", type=float, default=20.0, help="MB/s")
+    arg_parser.add_argument("--throttle-above", type=int, default=None)
+    arg_parser.add_argument("--max-concurrency", type=int, default=64)
+    args = arg_parser.parse_args()
+    http_client.DEFAULT_RETRY = http_client.RetryPolicy(base_delay=0.05)
+
+    server = MockBehance(
+        MockConfig(
+            image_latency=args.image_latency / 1000,
+            image_size=args.image_size,
+            bandwidth=args.bandwidth * 1024 * 1024,
+            throttle_above=args.throttle_above,
+        )
+    ).start()
+    print(f"link {args.bandwidth:.1f} MB/s, {args.image_latency:.0f} ms per image")
+    for concurrency in (1, 2, 4, 8, 16, 32):
+        throughput, _, throttled, failed = run(
+            server, args.images, concurrency, False
+        )
+        print(
+            f"fixed {concurrency:>3}: {throughput:6.1f} MB/s, "
+            f"{throttled} throttled, {failed} failed"
+        )
+    throughput, limit, throttled, failed = run(
+        server, args.images, args.max_concurrency, True
+    )
+    print(
+        f"adaptive : {throughput:6.1f} MB/s, {throttled} throttled, "
+        f"{failed} failed, settled at {limit} in flight"
+    )
+
+
+if __name__ == "__main__":
+    main()
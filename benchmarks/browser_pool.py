@@ -0,0 +1,153 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium.common.exceptions import WebDriverException
+
+from behance_parser.browser_pool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self, startup: float, page_latency: float) -> None:
+        time.sleep(startup)
+        self._page_latency = page_latency
+        self.crashed = False
+        self.closed = False
+        self.pages = 0
+
+    @property
+    def current_url(self) -> str:
+        if self.crashed:
+            raise WebDriverException("chrome not reachable")
+        return "about:blank"
+
+    def get(self, url: str) -> None:
+        if self.crashed:
+            raise WebDriverException("chrome not reachable")
+        time.sleep(self._page_latency)
+        self.pages += 1
+
+    def quit(self) -> None:
+        self.closed = True
+
+
+class DriverFactory:
+    def __init__(self, startup: float = 0.0, page_latency: float = 0.0) -> None:
+        self.drivers: list[FakeDriver] = []
+        self._startup = startup
+        self._page_latency = page_latency
+        self._lock = threading.Lock()
+
+    def __call__(self) -> FakeDriver:
+        driver = FakeDriver(self._startup, self._page_latency)
+        with self._lock:
+            self.drivers.append(driver)
+        return driver
+
+
+def _fail_page(pool: BrowserPool, crash: bool) -> FakeDriver:
+    try:
+        with pool.lease() as driver:
+            driver.crashed = crash
+            raise WebDriverException("page load timed out")
+    except WebDriverException:
+        return driver
+
+
+def _check_crash() -> None:
+    factory = DriverFactory()
+    pool = BrowserPool(size=1, driver_factory=factory)
+    alive = _fail_page(pool, crash=False)
+    with pool.lease() as driver:
+        assert driver is alive, "a live browser was discarded after a page error"
+    crashed = _fail_page(pool, crash=True)
+    assert crashed.closed, "a crashed browser was not quit"
+    with pool.lease() as driver:
+        assert driver is not crashed, "a crashed browser was leased again"
+        driver.get("about:blank")
+    pool.close()
+    assert len(factory.drivers) == 2
+
+
+def _check_recycling(recycle_after: int) -> None:
+    factory = DriverFactory()
+    pool = BrowserPool(size=1, driver_factory=factory, max_pages=recycle_after)
+    for _ in range(recycle_after + 1):
+        with pool.lease() as driver:
+            driver.get("about:blank")
+    first, second = factory.drivers
+    assert first.closed, f"browser was not recycled after {recycle_after} pages"
+    assert (first.pages, second.pages) == (recycle_after, 1)
+    pool.close()
+    assert second.closed, "close() left a browser running"
+
+
+def _check_size(size: int) -> None:
+    factory = DriverFactory(page_latency=0.005)
+    pool = BrowserPool(size=size, driver_factory=factory, max_pages=1000)
+    leased, peak = set(), 0
+    lock = threading.Lock()
+
+    def render(_: int) -> None:
+        nonlocal peak
+        with pool.lease() as driver:
+            with lock:
+                assert driver not in leased, "one browser was leased twice"
+                leased.add(driver)
+                peak = max(peak, len(leased))
+            driver.get("about:blank")
+            with lock:
+                leased.remove(driver)
+
+    with ThreadPoolExecutor(size * 2) as executor:
+        list(executor.map(render, range(size * 20)))
+    pool.close()
+    assert len(factory.drivers) <= size and peak <= size
+
+
+def run(
+    pages: int, browsers: int, recycle_after: int, startup: float, page_latency: float
+) -> tuple[float, int]:
+    _check_size(browsers)
+    factory = DriverFactory(startup, page_latency)
+    pool = BrowserPool(size=browsers, driver_factory=factory, max_pages=recycle_after)
+
+    def render(i: int) -> None:
+        with pool.lease() as driver:
+            driver.get(f"https://www.behance.net/gallery/{i}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(browsers) as executor:
+        list(executor.map(render, range(pages)))
+    elapsed = time.perf_counter() - started
+    pool.close()
+    return pages / elapsed, len(factory.drivers)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--pages", type=int, default=200)
+    arg_parser.add_argument("--recycle-after", type=int, default=50)
+    arg_parser.add_argument("--startup", type=float, default=500.0, help="ms")
+    arg_parser.add_argument("--page-latency", type=float, default=50.0, help="ms")
+    args = arg_parser.parse_args()
+    _check_crash()
+    _check_recycling(args.recycle_after)
+    print("crashed browsers replaced, browsers recycled after", args.recycle_after)
+    for browsers in (1, 2, 4, 8):
+        throughput, started = run(
+            args.pages,
+            browsers,
+            args.recycle_after,
+            args.startup / 1000,
+            args.page_latency / 1000,
+        )
+        print(
+            f"{browsers} browsers: {throughput:6.1f} pages/s, "
+            f"{started} browser starts"
+        )
+
+
+if __name__ == "__main__":
+    main()
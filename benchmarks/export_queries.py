@@ -0,0 +1,51 @@
+import argparse
+import tempfile
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from benchmarks.storage_writes import _content, _create_tasks
+from behance_parser import exporter, storage
+
+MAX_QUERIES_PER_AGENCY = 5
+
+
+def _count_export_queries(projects: int, modules: int, tmp_dir: Path) -> int:
+    storage.configure(str(tmp_dir / f"export-{projects}.db"))
+    for task in _create_tasks(projects, offset=0):
+        texts, videos, _ = _content(task.id, modules)
+        storage.store_project_content(task, texts, videos, {}, mark_parsed=True)
+    storage.db_session.remove()
+
+    statements: list[str] = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("PRAGMA"):
+            statements.append(statement)
+
+    sa.event.listen(storage.engine, "before_cursor_execute", _on_execute)
+    try:
+        exporter.export_data_to(str(tmp_dir / f"export-{projects}"), full=True)
+    finally:
+        sa.event.remove(storage.engine, "before_cursor_execute", _on_execute)
+    agencies = storage.get_all_agencies()
+    return (len(statements) - 1) // len(agencies)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--modules", type=int, default=30)
+    args = arg_parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        counts = {
+            projects: _count_export_queries(projects, args.modules, Path(tmp_dir))
+            for projects in (10, 100)
+        }
+    for projects, queries in counts.items():
+        print(f"{projects:>5} projects: {queries} queries per agency")
+    assert len(set(counts.values())) == 1, "query count grows with project count"
+    assert counts[10] <= MAX_QUERIES_PER_AGENCY, "too many queries per agency"
+
+
+if __name__ == "__main__":
+    main()
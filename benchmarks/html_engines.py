@@ -0,0 +1,59 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from behance_parser import html_engines
+from behance_parser.exceptions import ParsingException
+
+DEFAULT_CORPUS = Path(__file__).parent / "fixtures" / "pages"
+
+
+def _extract(engine: html_engines.Engine, html: str):
+    try:
+        return engine.extract(html)
+    except ParsingException as exc:
+        return type(exc)
+
+
+def _time_engine(engine: html_engines.Engine, pages: list[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            _extract(engine, html)
+    return (time.perf_counter() - started) / (rounds * len(pages))
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--rounds", type=int, default=20)
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+
+    paths = sorted(args.corpus.glob("*.html"))
+    pages = [path.read_text() for path in paths]
+    engines = [html_engines.get_engine(name) for name in html_engines.ENGINES]
+    reference, *others = engines
+
+    mismatches = 0
+    for path, html in zip(paths, pages):
+        expected = _extract(reference, html)
+        for engine in others:
+            if _extract(engine, html) != expected:
+                mismatches += 1
+                print(f"{path.name}: {engine.name} differs from {reference.name}")
+
+    timings = {
+        engine.name: _time_engine(engine, pages, args.rounds) for engine in engines
+    }
+    print(f"{len(pages)} pages, {mismatches} mismatches")
+    for name, seconds in timings.items():
+        speedup = timings[reference.name] / seconds
+        print(f"{name:>12}: {seconds * 1000:8.2f} ms/page ({speedup:.1f}x)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
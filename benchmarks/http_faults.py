@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import sqlalchemy as sa
+from aiohttp import web
+
+from behance_parser import html_parser, http_client, storage
+from behance_parser.blob_store import BlobStore
+from behance_parser.fetcher import Project
+from behance_parser.image_loader import DownloadService
+
+RECOVERING = ("ok", "unavailable", "throttled", "reset", "slow")
+BROKEN = ("missing", "limited", "truncated")
+DOWN = "down"
+
+
+class FaultyServer:
+    def __init__(self, port: int, payload_size: int, slow_seconds: float) -> None:
+        self.port = port
+        self.requests: Counter[str] = Counter()
+        self._payload = os.urandom(payload_size)
+        self._slow_seconds = slow_seconds
+        self._ready = threading.Event()
+
+    async def _image(self, request: web.Request) -> web.StreamResponse:
+        fault = request.match_info["fault"]
+        self.requests[request.path] += 1
+        first = self.requests[request.path] == 1
+        if fault == "missing":
+            return web.Response(status=404)
+        if fault == DOWN:
+            return web.Response(status=500)
+        if fault == "limited" or (fault == "throttled" and first):
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if fault == "unavailable" and first:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        if fault == "reset" and first:
+            request.transport.close()
+            return web.Response()
+        if fault == "slow" and first:
+            await asyncio.sleep(self._slow_seconds)
+        if fault == "truncated":
+            response = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+            response.content_length = len(self._payload)
+            await response.prepare(request)
+            await response.write(self._payload[: len(self._payload) // 2])
+            request.transport.close()
+            return response
+        return web.Response(body=self._payload, content_type="image/jpeg")
+
+    def _serve(self) -> None:
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get("/img/{fault}/{name}", self._image)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        # Every port is its own host for the circuit breakers.
+        for port in (self.port, self.port + 1):
+            site = web.TCPSite(runner, "127.0.0.1", port)
+            loop.run_until_complete(site.start())
+        self._ready.set()
+        loop.run_forever()
+
+    def start(self) -> None:
+        threading.Thread(target=self._serve, daemon=True).start()
+        self._ready.wait()
+
+
+def _create_task(behance_id: int, urls: list[str]) -> int:
+    project = Project(id=behance_id, name="faults", url="u", fields=[], covers={})
+    storage.store_projects([project], agency_name="faults")
+    query = sa.select(storage.Task).where(storage.Task.behance_id == behance_id)
+    task = storage.db_session.execute(query).scalar_one()
+    storage.store_project_content(task, {}, {}, {}, image_urls=urls)
+    return task.id
+
+
+def _download(task_id: int, concurrency: int, store: BlobStore) -> None:
+    service = DownloadService(
+        concurrency=concurrency, adaptive=False, store=store, cache=None
+    )
+    try:
+        downloads = {
+            image.id: service.submit(image.url, [])
+            for image in storage.get_pending_images(task_id)
+        }
+        html_parser.store_downloads(task_id, downloads)
+    finally:
+        service.close()
+
+
+def _fault(image: storage.Image) -> str:
+    return image.url.split("/")[-2]
+
+
+def _check_recovering(images: list[storage.Image]) -> None:
+    for image in images:
+        assert (image.status, image.attempts, image.retry_after) == (
+            storage.IMAGE_DONE,
+            1,
+            None,
+        ), f"{image.url} did not recover: {image.status}, {image.error}"
+
+
+def _check_broken(images: list[storage.Image], started: datetime) -> None:
+    for image in images:
+        assert image.status == storage.IMAGE_FAILED, f"{image.url} was stored"
+        assert image.attempts == 1, f"{image.url} has {image.attempts} attempts"
+        assert image.retry_after > started, f"{image.url} has no retry delay"
+
+
+def _check_down(images: list[storage.Image], started: datetime) -> None:
+    first, *deferred = sorted(images, key=lambda image: image.id)
+    _check_broken([first], started)
+    for image in deferred:
+        assert image.status == storage.IMAGE_FAILED, f"{image.url} was stored"
+        assert "CircuitOpenException" in image.error, image.error
+        assert image.attempts == 0, f"circuit-open {image.url} counted an attempt"
+        assert image.retry_after > started, f"{image.url} has no retry delay"
+
+
+def _check_task(task_id: int) -> None:
+    task = storage.get_task_by_id(task_id)
+    assert not task.is_parsed and not task.error, "task with retries left finished"
+    assert task.lease_expires_at is not None, "task is claimable before its retry"
+
+
+def _summary(images: list[storage.Image]) -> Counter[str]:
+    return Counter(f"{_fault(i)}:{i.status}:{i.attempts}" for i in images)
+
+
+def run(images: int, port: int, payload_size: int) -> Counter[str]:
+    http_client.READ_TIMEOUT = 1
+    http_client.DEFAULT_RETRY = http_client.RetryPolicy(attempts=2, base_delay=0.05)
+    server = FaultyServer(port, payload_size, slow_seconds=3)
+    server.start()
+    faults = RECOVERING + BROKEN
+    urls = [
+        f"http://127.0.0.1:{port}/img/{faults[i % len(faults)]}/{i}.jpg"
+        for i in range(images)
+    ]
+    down_urls = [
+        f"http://127.0.0.1:{port + 1}/img/{DOWN}/{i}.jpg" for i in range(images // 5)
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage.configure(str(Path(tmp_dir) / "faults.db"))
+        store = BlobStore(Path(tmp_dir) / "blobs")
+        started = datetime.utcnow()
+
+        # Recovering faults must not open the breaker, a dead host must.
+        http_client.BREAKER_FAILURE_THRESHOLD = images
+        task_id = _create_task(1, urls)
+        _download(task_id, concurrency=10, store=store)
+        http_client.BREAKER_FAILURE_THRESHOLD = 3
+        down_task_id = _create_task(2, down_urls)
+        _download(down_task_id, concurrency=1, store=store)
+
+        storage.db_session.expire_all()
+        rows = storage.get_task_images(task_id)
+        _check_recovering([i for i in rows if _fault(i) in RECOVERING])
+        _check_broken([i for i in rows if _fault(i) in BROKEN], started)
+        _check_task(task_id)
+        down_rows = storage.get_task_images(down_task_id)
+        _check_down(down_rows, started)
+        _check_task(down_task_id)
+        storage.db_session.remove()
+    return _summary(rows + down_rows)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--images", type=int, default=48)
+    arg_parser.add_argument("--port", type=int, default=8799)
+    arg_parser.add_argument("--payload-size", type=int, default=64 * 1024)
+    args = arg_parser.parse_args()
+    started = time.perf_counter()
+    summary = run(args.images, args.port, args.payload_size)
+    for key, count in sorted(summary.items()):
+        fault, status, attempts = key.split(":")
+        print(f"{fault:<12}{status:<8}attempts={attempts}  x{count}")
+    print(f"all image rows as expected in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from aiohttp import web
+
+FIXTURES = Path(__file__).parent / "fixtures"
+CDN_URL = "https://mir-s3-cdn-cf.behance.net/"
+PAGE_SIZE = 12
+PAYLOAD_VARIANTS = 64
+CHUNK_SIZE = 16 * 1024
+
+
+@dataclass(frozen=True)
+class MockConfig:
+    projects_per_agency: int = 24
+    listing_latency: float = 0.0
+    page_latency: float = 0.0
+    image_latency: float = 0.0
+    jitter: float = 0.0
+    image_size: int = 64 * 1024
+    bandwidth: float | None = None
+    throttle_above: int | None = None
+    seed: int = 0
+
+
+class MockBehance:
+    def __init__(self, config: MockConfig, port: int = 0) -> None:
+        self.config = config
+        self.port = port
+        self._random = random.Random(config.seed)
+        listing_path = FIXTURES / "listings" / "projects.json"
+        self._listing = json.loads(listing_path.read_text())
+        self._pages = [
+            path.read_text() for path in sorted((FIXTURES / "pages").glob("*.html"))
+        ]
+        payload_random = random.Random(config.seed)
+        self._payloads = [
+            payload_random.randbytes(config.image_size) for _ in range(PAYLOAD_VARIANTS)
+        ]
+        self._ready = threading.Event()
+        self._link_free_at = 0.0
+        self._active_images = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/"
+
+    async def _delay(self, latency: float) -> None:
+        delay = latency + self._random.uniform(0, self.config.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _projects(self, request: web.Request) -> web.Response:
+        await self._delay(self.config.listing_latency)
+        agency = request.match_info["agency"]
+        offset = int(request.query.get("offset", 0))
+        agency_id = int(hashlib.sha1(agency.encode()).hexdigest()[:6], 16)
+        template = self._listing["profile"]["activeSection"]["work"]["projects"]
+        count = max(0, min(PAGE_SIZE, self.config.projects_per_agency - offset))
+        projects = []
+        for i in range(count):
+            project = copy.deepcopy(template[i % len(template)])
+            project["id"] = agency_id * 100_000 + offset + i
+            project["url"] = f"{self.base_url}gallery/{project['id']}/{project['slug']}"
+            projects.append(project)
+        listing = copy.deepcopy(self._listing)
+        work = listing["profile"]["activeSection"]["work"]
+        work["projects"] = projects
+        work["hasMore"] = offset + count < self.config.projects_per_agency
+        return web.json_response(listing)
+
+    async def _page(self, request: web.Request) -> web.Response:
+        await self._delay(self.config.page_latency)
+        project_id = int(request.match_info["project_id"])
+        html = self._pages[project_id % len(self._pages)].replace(
+            CDN_URL, f"{self.base_url}cdn/{project_id}/"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def _transmit(self, size: int) -> None:
+        now = asyncio.get_running_loop().time()
+        self._link_free_at = max(now, self._link_free_at) + size / self.config.bandwidth
+        await asyncio.sleep(self._link_free_at - now)
+
+    async def _image(self, request: web.Request) -> web.StreamResponse:
+        limit = self.config.throttle_above
+        if limit is not None and self._active_images >= limit:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        self._active_images += 1
+        try:
+            await self._delay(self.config.image_latency)
+            digest = hashlib.sha1(request.path.encode()).digest()
+            payload = self._payloads[digest[0] % PAYLOAD_VARIANTS]
+            if not self.config.bandwidth:
+                return web.Response(body=payload, content_type="image/jpeg")
+            response = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+            response.content_length = len(payload)
+            await response.prepare(request)
+            for offset in range(0, len(payload), CHUNK_SIZE):
+                chunk = payload[offset : offset + CHUNK_SIZE]
+                await self._transmit(len(chunk))
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            self._active_images -= 1
+
+    def _serve(self) -> None:
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get("/cdn/{path:.+}", self._image)
+        app.router.add_get("/gallery/{project_id:\\d+}/{slug}", self._page)
+        app.router.add_get("/{agency}/projects", self._projects)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", self.port)
+        loop.run_until_complete(site.start())
+        self.port = runner.addresses[0][1]
+        self._ready.set()
+        loop.run_forever()
+
+    def start(self) -> "MockBehance":
+        threading.Thread(target=self._serve, name="mock-behance", daemon=True).start()
+        self._ready.wait()
+        return self
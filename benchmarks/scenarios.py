@@ -0,0 +1,230 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.mock_behance import MockBehance, MockConfig
+
+SCENARIOS = ("collect", "process", "export")
+STAGES = {
+    "collect": ("listing_fetch", "db_query", "db_commit"),
+    "process": (
+        "page_fetch",
+        "page_load",
+        "page_wait",
+        "parse",
+        "store",
+        "image_download",
+        "db_commit",
+    ),
+    "export": ("export", "db_query"),
+}
+
+
+def _peak_rss_mb(who: int) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def _count_tasks(*criteria) -> int:
+    import sqlalchemy as sa
+
+    from behance_parser import storage
+
+    query = sa.select(sa.func.count()).select_from(storage.Task).where(*criteria)
+    return storage.db_session.execute(query).scalar_one()
+
+
+def _collect(args: argparse.Namespace) -> int:
+    from behance_parser import parser, storage
+
+    storage.create_agencies([f"agency-{i}" for i in range(args.agencies)])
+    parser.collect_tasks_for_parsing(
+        concurrency=args.concurrency,
+        rate=args.rate,
+        per_host_rate=args.rate,
+        cookies=[],
+        full=True,
+    )
+    return _count_tasks()
+
+
+def _process(args: argparse.Namespace) -> int:
+    from behance_parser import html_parser, storage
+
+    html_parser.process_tasks(
+        browsers=args.browsers,
+        recycle_after=args.recycle_after,
+        http_first=not args.browser_only,
+        fetchers=args.concurrency,
+        parsers=args.parsers,
+        writers=args.writers,
+    )
+    return _count_tasks(storage.Task.is_parsed.is_(True))
+
+
+def _export(args: argparse.Namespace) -> int:
+    from behance_parser import exporter, metrics
+
+    exporter.export_data_to(str(Path(args.workdir) / "export"), workers=args.writers)
+    return metrics.stage_seconds.summaries().get(("export",), (0,))[0]
+
+
+def _run_scenario(name: str, args: argparse.Namespace, results) -> None:
+    from behance_parser import http_client, metrics
+
+    run = dict(collect=_collect, process=_process, export=_export)[name]
+    started = time.perf_counter()
+    items = run(args)
+    seconds = time.perf_counter() - started
+    http_client.close()
+    latency = {
+        stage: dict(
+            count=metrics.stage_seconds.summaries().get((stage,), (0,))[0],
+            p50_ms=round(metrics.stage_seconds.quantile(0.5, stage=stage) * 1000, 3),
+            p99_ms=round(metrics.stage_seconds.quantile(0.99, stage=stage) * 1000, 3),
+        )
+        for stage in STAGES[name]
+    }
+    downloaded = sum(metrics.downloaded_bytes.values().values())
+    results.put(
+        dict(
+            scenario=name,
+            items=items,
+            seconds=round(seconds, 3),
+            throughput=round(items / seconds, 2) if seconds else 0,
+            downloaded_mb=round(downloaded / 1024 / 1024, 2),
+            latency=latency,
+            peak_rss_mb=round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+            children_peak_rss_mb=round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        )
+    )
+
+
+def _environment(args: argparse.Namespace, server: MockBehance) -> dict[str, str]:
+    workdir = Path(args.workdir)
+    return dict(
+        BEHANCE_URL=server.base_url,
+        BEHANCE_DB_PATH=str(workdir / "data.db"),
+        BEHANCE_BLOB_DIR=str(workdir / "blobs"),
+        BEHANCE_HTTP_CACHE_DIR=str(workdir / "http-cache") if args.http_cache else "",
+    )
+
+
+def run(args: argparse.Namespace) -> dict:
+    server = MockBehance(
+        MockConfig(
+            projects_per_agency=args.projects,
+            listing_latency=args.listing_latency / 1000,
+            page_latency=args.page_latency / 1000,
+            image_latency=args.image_latency / 1000,
+            jitter=args.jitter / 1000,
+            image_size=args.image_size,
+            bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+            throttle_above=args.throttle_above,
+            seed=args.seed,
+        )
+    ).start()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    environment = os.environ.copy()
+    os.environ.update(_environment(args, server))
+    try:
+        reports = []
+        for name in args.scenarios:
+            process = context.Process(
+                target=_run_scenario, args=(name, args, results), name=name
+            )
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise SystemExit(f"Scenario {name} exited with {process.exitcode}")
+            reports.append(results.get())
+    finally:
+        os.environ.clear()
+        os.environ.update(environment)
+    config = {key: value for key, value in vars(args).items() if key != "workdir"}
+    return dict(
+        created_at=datetime.utcnow().isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        config=config,
+        results=reports,
+    )
+
+
+def _print_report(report: dict, baseline: dict | None) -> None:
+    previous = {
+        result["scenario"]: result for result in (baseline or {}).get("results", [])
+    }
+    for result in report["results"]:
+        line = (
+            f"{result['scenario']:>8}: {result['items']} items in "
+            f"{result['seconds']:.2f}s, {result['throughput']:.1f}/s, "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+        if before := previous.get(result["scenario"]):
+            change = result["throughput"] / before["throughput"] - 1
+            line += f" ({change:+.1%} vs baseline)"
+        print(line)
+        for stage, latency in result["latency"].items():
+            if latency["count"]:
+                print(
+                    f"{stage:>22}: p50 {latency['p50_ms']:.1f} ms, "
+                    f"p99 {latency['p99_ms']:.1f} ms ({latency['count']} samples)"
+                )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run, repeat for several  [default: all in order]",
+    )
+    arg_parser.add_argument("--agencies", type=int, default=4)
+    arg_parser.add_argument("--projects", type=int, default=24)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--rate", type=float, default=1000.0)
+    arg_parser.add_argument("--parsers", type=int, default=2)
+    arg_parser.add_argument("--writers", type=int, default=4)
+    arg_parser.add_argument(
+        "--browser-only",
+        action="store_true",
+        help="Render every project page in headless Chrome instead of HTTP first",
+    )
+    arg_parser.add_argument("--browsers", type=int, default=1)
+    arg_parser.add_argument("--recycle-after", type=int, default=50)
+    arg_parser.add_argument("--listing-latency", type=float, default=20.0)
+    arg_parser.add_argument("--page-latency", type=float, default=50.0)
+    arg_parser.add_argument("--image-latency", type=float, default=20.0)
+    arg_parser.add_argument("--jitter", type=float, default=10.0)
+    arg_parser.add_argument("--image-size", type=int, default=64 * 1024)
+    arg_parser.add_argument("--bandwidth", type=float, default=None, help="MB/s")
+    arg_parser.add_argument("--throttle-above", type=int, default=None)
+    arg_parser.add_argument("--http-cache", action="store_true")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--workdir", type=Path, default=None)
+    arg_parser.add_argument("--output", type=Path, default=None)
+    arg_parser.add_argument("--baseline", type=Path, default=None)
+    args = arg_parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args.workdir = str(args.workdir or tmp_dir)
+        report = run(args)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    _print_report(report, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, default=str) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import multiprocessing
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.storage_writes import _content, _create_tasks
+from behance_parser import storage
+
+PROFILES = {
+    # No pragmas: rollback journal and pysqlite's stock 5 second lock timeout.
+    "default": {},
+    "tuned": storage.SQLITE_PRAGMAS,
+}
+
+
+def _writer(
+    profile: str, path: str, task_ids: list[int], modules: int, start, results
+) -> None:
+    storage.configure(path, sqlite_pragmas=PROFILES[profile])
+    stats = Counter(rows_written=0, write_errors=0)
+    start.wait()
+    for task_id in task_ids:
+        task = storage.get_task_by_id(task_id)
+        texts, videos, images = _content(task.id, modules)
+        try:
+            storage.store_project_content(
+                task,
+                texts=texts,
+                videos=videos,
+                images=images,
+                mark_parsed=True,
+            )
+            stats["rows_written"] += modules
+        except OperationalError:
+            storage.db_session.rollback()
+            stats["write_errors"] += 1
+    storage.db_session.remove()
+    results.put(stats)
+
+
+def _reader(profile: str, path: str, start, stop, results) -> None:
+    storage.configure(path, sqlite_pragmas=PROFILES[profile])
+    stats = Counter(rows_read=0, read_errors=0)
+    start.wait()
+    while not stop.is_set():
+        try:
+            agencies = storage.get_all_agencies()
+            for agency in agencies:
+                for task in storage.get_tasks_by_agency_id(agency.id):
+                    stats["rows_read"] += len(storage.get_task_texts(task.id))
+                    storage.get_task_videos(task.id)
+                    storage.get_task_images(task.id)
+        except OperationalError:
+            storage.db_session.rollback()
+            stats["read_errors"] += 1
+    storage.db_session.remove()
+    results.put(stats)
+
+
+def run(
+    profile: str,
+    projects: int,
+    modules: int,
+    writers: int,
+    readers: int,
+    directory: str | None,
+) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start, stop = context.Barrier(writers + readers + 1), context.Event()
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        path = str(Path(tmp_dir) / f"{profile}.db")
+        storage.configure(path, sqlite_pragmas=PROFILES[profile])
+        task_ids = [task.id for task in _create_tasks(projects, offset=0)]
+        writer_processes = [
+            context.Process(
+                target=_writer,
+                args=(profile, path, task_ids[i::writers], modules, start, results),
+            )
+            for i in range(writers)
+        ]
+        reader_processes = [
+            context.Process(target=_reader, args=(profile, path, start, stop, results))
+            for _ in range(readers)
+        ]
+        for process in writer_processes + reader_processes:
+            process.start()
+        start.wait()
+        started = time.perf_counter()
+        for process in writer_processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        stats = Counter()
+        for _ in writer_processes + reader_processes:
+            stats.update(results.get())
+        for process in reader_processes:
+            process.join()
+        journal_mode = storage.db_session.execute(
+            sa.text("PRAGMA journal_mode")
+        ).scalar()
+        storage.db_session.remove()
+        storage.engine.dispose()
+    return dict(
+        stats,
+        journal_mode=journal_mode,
+        writes_per_second=stats["rows_written"] / elapsed,
+        reads_per_second=stats["rows_read"] / elapsed,
+    )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--projects", type=int, default=80)
+    arg_parser.add_argument("--modules", type=int, default=2000)
+    arg_parser.add_argument("--writers", type=int, default=8)
+    arg_parser.add_argument("--readers", type=int, default=4)
+    arg_parser.add_argument(
+        "--dir", default=None, help="Directory for the databases, use a real disk"
+    )
+    args = arg_parser.parse_args()
+    for profile in PROFILES:
+        stats = run(
+            profile,
+            args.projects,
+            args.modules,
+            args.writers,
+            args.readers,
+            args.dir,
+        )
+        print(
+            f"{profile:>8} ({stats['journal_mode']}): "
+            f"{stats['writes_per_second']:8.1f} rows/s written "
+            f"({stats['write_errors']} lock errors), "
+            f"{stats['reads_per_second']:8.1f} rows/s read "
+            f"({stats['read_errors']} lock errors)"
+        )
+
+
+if __name__ == "__main__":
+    main()
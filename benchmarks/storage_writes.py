@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from behance_parser import storage
+from behance_parser.blob_store import Blob
+from behance_parser.fetcher import Project
+
+
+def _create_tasks(count: int, offset: int) -> list[storage.Task]:
+    projects = [
+        Project(id=offset + i, name=f"p{i}", url=f"u{i}", fields=[], covers={})
+        for i in range(count)
+    ]
+    storage.store_projects(projects, agency_name="benchmark")
+    query = sa.select(storage.Task).where(storage.Task.behance_id >= offset)
+    return storage.db_session.execute(query).scalars().all()
+
+
+def _content(task_id: int, modules: int) -> tuple[dict, dict, dict]:
+    texts, videos, images = {}, {}, {}
+    for i in range(modules):
+        key = hashlib.sha1(f"{task_id}-{i}".encode()).hexdigest()
+        if i % 3 == 0:
+            texts[key] = f"text {i}"
+        elif i % 3 == 1:
+            videos[key] = f"https://example.com/{i}"
+        else:
+            images[f"{key}.jpg"] = Blob(hash=key, size=1, mime_type="image/jpeg")
+    return texts, videos, images
+
+
+def _row_by_row(tasks: list[storage.Task], modules: int) -> None:
+    for task in tasks:
+        texts, videos, images = _content(task.id, modules)
+        for uuid, text in texts.items():
+            storage.store_text(uuid=uuid, text=text, task=task)
+        for uuid, link in videos.items():
+            storage.store_video(uuid=uuid, link=link, task=task)
+        for uuid, blob in images.items():
+            storage.store_image(uuid=uuid, blob=blob, task=task)
+        storage.set_task_parsing_status(task, is_parsed=True)
+
+
+def _bulk(tasks: list[storage.Task], modules: int) -> None:
+    for task in tasks:
+        texts, videos, images = _content(task.id, modules)
+        storage.store_project_content(
+            task,
+            texts=texts,
+            videos=videos,
+            images=images,
+            mark_parsed=True,
+        )
+
+
+def run(projects: int, modules: int) -> dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage.configure(str(Path(tmp_dir) / "benchmark.db"))
+        for offset, (name, write) in enumerate(
+            [("row_by_row", _row_by_row), ("bulk", _bulk)]
+        ):
+            tasks = _create_tasks(projects, offset=offset * projects)
+            started = time.perf_counter()
+            write(tasks, modules)
+            elapsed = time.perf_counter() - started
+            results[name] = projects * modules / elapsed
+        storage.db_session.remove()
+    return results
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--projects", type=int, default=50)
+    arg_parser.add_argument("--modules", type=int, default=60)
+    args = arg_parser.parse_args()
+    results = run(args.projects, args.modules)
+    for name, rows_per_second in results.items():
+        print(f"{name:>12}: {rows_per_second:10.1f} rows/sec")
+    print(f"{'speedup':>12}: {results['bulk'] / results['row_by_row']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
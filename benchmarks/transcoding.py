@@ -0,0 +1,80 @@
+import argparse
+import io
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from behance_parser import transcoder
+
+SIZES = [(3840, 2160), (1920, 1280), (1400, 1050), (800, 600)]
+
+
+def _synthetic_jpeg(width: int, height: int, seed: int) -> bytes:
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(20, max(21, width // 6))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    noise = Image.effect_noise((width, height), 24).convert("RGB")
+    image = Image.blend(image.filter(ImageFilter.GaussianBlur(2)), noise, 0.15)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def _load_corpus(corpus: Path | None, count: int) -> list[bytes]:
+    if corpus:
+        return [path.read_bytes() for path in sorted(corpus.iterdir())[:count]]
+    return [_synthetic_jpeg(*SIZES[i % len(SIZES)], seed=i) for i in range(count)]
+
+
+def _run(
+    images: list[bytes], options: transcoder.TranscodeOptions, store_root: str
+) -> tuple[int, float]:
+    stored = 0
+    started = time.process_time()
+    for data in images:
+        stored += transcoder.transcode(data, options, store_root).size
+    return stored, (time.process_time() - started) / len(images)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--corpus", type=Path, default=None)
+    arg_parser.add_argument("--images", type=int, default=8)
+    arg_parser.add_argument("--quality", type=int, default=80)
+    arg_parser.add_argument("--max-width", type=int, default=1400)
+    args = arg_parser.parse_args()
+    logging.disable(logging.WARNING)
+    if transcoder.PillowImage is None:
+        raise SystemExit("Pillow is not installed")
+
+    images = _load_corpus(args.corpus, args.images)
+    original = sum(len(i) for i in images)
+    print(f"{len(images)} images, {original / 1024 / 1024:.1f} MB as downloaded")
+    for image_format in transcoder.FORMATS:
+        if not transcoder.is_available(transcoder.TranscodeOptions(image_format)):
+            continue
+        for max_width in (None, args.max_width):
+            options = transcoder.TranscodeOptions(
+                format=image_format, quality=args.quality, max_width=max_width
+            )
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                stored, cpu = _run(images, options, tmp_dir)
+            saved = 1 - stored / original
+            print(
+                f"{image_format:>5} max width {max_width or '-':>5}: "
+                f"{stored / 1024 / 1024:6.1f} MB ({saved:6.1%} saved), "
+                f"{cpu * 1000:7.1f} ms CPU/image"
+            )
+
+
+if __name__ == "__main__":
+    main()